@@ -1,15 +1,38 @@
+import argparse
+import contextlib
+import csv
+import heapq
+import itertools
+import json
 import math
-from datetime import datetime, timedelta
+import os
 import random
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for the vectorized helpers
+    np = None
 
 class Route:
-    def __init__(self, route_id, estimated_time, length, avg_priority):
+    __slots__ = ("route_id", "estimated_time", "length", "avg_priority", "schedule",
+                 "last_assigned_time", "frequency", "depot_id")
+
+    def __init__(self, route_id, estimated_time, length, avg_priority, depot_id=None):
         self.route_id = route_id
         self.estimated_time = estimated_time
         self.length = length
         self.avg_priority = avg_priority
+        self.depot_id = depot_id
         self.schedule = []
-        self.last_assigned_time = None  # Track when this route was last assigned
+        self.last_assigned_time = None  # Minute of the service day this route last departed
         # Calculate frequency based on priority
         self.frequency = self._calculate_frequency()
         
@@ -26,15 +49,312 @@ class Route:
         # Priority 10 -> 10 minutes
         return int(40 - ((normalized_priority - 1) / 9) * 30)
 
+class IntervalIndex:
+    """Sorted, non-overlapping [start, end) intervals with O(log n) overlap checks"""
+    __slots__ = ("starts", "ends")
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps(self, start, end):
+        # Only the neighbours around the insertion point can overlap, because
+        # the stored intervals never overlap each other
+        i = bisect_right(self.starts, start)
+        if i > 0 and self.ends[i - 1] > start:
+            return True
+        return i < len(self.starts) and self.starts[i] < end
+
+    def add(self, start, end):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+
+    def remove(self, start, end):
+        # Start times are unique because the intervals never overlap
+        i = bisect_left(self.starts, start)
+        del self.starts[i]
+        del self.ends[i]
+
+    def clear(self):
+        self.starts.clear()
+        self.ends.clear()
+
 class Employee:
-    def __init__(self, emp_id, name, shift):
+    __slots__ = ("emp_id", "name", "shift", "assigned_routes", "total_work_time",
+                 "target_work_time", "available_after", "busy", "depot_id",
+                 "rest_until", "work_limit", "week_work_time")
+
+    def __init__(self, emp_id, name, shift, depot_id=None):
         self.emp_id = emp_id
         self.name = name
         self.shift = shift
+        self.depot_id = depot_id
         self.assigned_routes = []
         self.total_work_time = 0
         self.target_work_time = 540
-        self.available_after = None  # Time when employee becomes available again
+        self.available_after = None  # Minute of the service day when employee is free again
+        self.busy = IntervalIndex()  # Intervals already assigned in the current attempt
+        # Carried over between days by iter_horizon; None means no constraint
+        self.rest_until = None  # Minute of the service day the previous day's rest ends
+        self.work_limit = None  # Most minutes the employee may work today
+        self.week_work_time = 0  # Minutes worked on earlier days of the week
+
+    def clear_day(self):
+        """Forget the current day's trips, keeping any rest carried over from the previous day"""
+        self.total_work_time = 0
+        self.busy.clear()
+        self.available_after = SERVICE_START
+        # Rest that ends before the shift's first departure cannot bind
+        shift_start = (MORNING_SHIFT if self.shift == "morning" else EVENING_SHIFT)[0] * 60
+        if self.rest_until is not None and self.rest_until > max(SERVICE_START, shift_start):
+            # Blocking the rest period keeps every conflict check honouring it
+            self.busy.add(SERVICE_START, self.rest_until)
+            self.available_after = self.rest_until
+
+    def over_limit(self, minutes):
+        return self.work_limit is not None and self.total_work_time + minutes > self.work_limit
+
+class DepartureTable:
+    """Every departure of a set of routes as parallel integer arrays.
+    
+    A departure's id is its index into the arrays. Ids are split into
+    morning and evening lists while the table is built.
+    """
+    __slots__ = ("route_index", "start", "end", "morning", "evening")
+
+    def __init__(self, routes):
+        self.route_index = array("i")
+        self.start = array("i")
+        self.end = array("i")
+        self.morning = []
+        self.evening = []
+        for ri, route in enumerate(routes):
+            for departure_time in route.schedule:
+                departure = len(self.start)
+                self.route_index.append(ri)
+                self.start.append(departure_time)
+                self.end.append(departure_time + route.estimated_time)
+                if is_morning(departure_time):
+                    self.morning.append(departure)
+                else:
+                    self.evening.append(departure)
+
+    def __len__(self):
+        return len(self.start)
+
+class AvailabilityPool:
+    """Employees of one shift, ordered by when they are free and by work time.
+    
+    Busy employees wait in a heap keyed on available_after and move to the
+    free heap, keyed on total_work_time, once a departure at or after that
+    time is requested. Candidates come out in work-time order, and the scan
+    stops as soon as the work-time part of the score alone cannot beat the
+    best candidate found so far. When departures are not requested in time
+    order, a free employee who turns out to be busy until later goes back
+    to the waiting heap, so it is not scanned again before then.
+    
+    Employees with no trips yet are interchangeable, so they are kept apart
+    and scored as one candidate instead of being scanned one by one.
+    
+    The relaxed second pass (pick_least_loaded) uses a separate index of the
+    gaps between each employee's trips; once it starts, pick() is not used.
+    """
+    def __init__(self, employees):
+        # Entries are (key, position, employee); position keeps ties in list order
+        self._positions = {id(emp): i for i, emp in enumerate(employees)}
+        self.waiting = []
+        self.idle = []  # Highest position first, so pop() takes the earliest listed
+        for i, emp in enumerate(employees):
+            if emp.total_work_time == 0 and not emp.busy and emp.work_limit is None:
+                self.idle.append((0, i, emp))
+            else:
+                self.waiting.append((emp.available_after, i, emp))
+        self.idle.reverse()
+        heapq.heapify(self.waiting)
+        self.free = []
+        # Gap index for pick_least_loaded, built on its first call
+        self.pending_gaps = None  # (gap start, position, gap end, employee), not yet open
+        self.open_gaps = []  # (total_work_time, position, gap start, gap end, employee)
+        self.gap_time = None  # Start of the latest relaxed request
+        self._chosen_gap_end = None
+        # Work counters, read by try_assign_employees for SchedulerStats
+        self.candidates_scanned = 0
+        self.conflict_checks = 0
+
+    def _release(self, current_time):
+        while self.waiting and self.waiting[0][0] <= current_time:
+            _, i, emp = heapq.heappop(self.waiting)
+            heapq.heappush(self.free, (emp.total_work_time, i, emp))
+
+    def pick(self, start, end, work_time_weight, variety_score, rng):
+        """Pop the free employee with the lowest score for [start, end).
+        
+        The score is (total_work_time / 10) * work_time_weight plus
+        variety_score(emp), which must never be negative, plus a random
+        tie-breaker in [0, 5) drawn from rng.
+        """
+        self._release(start)
+        scanned = []
+        best = None
+        min_score = float('inf')
+        
+        if self.idle and self.idle[-1][2].available_after <= start:
+            # The best of k idle employees scores the smallest of k tie-breakers
+            best = self.idle[-1]
+            min_score = variety_score(best[2]) + 5 * (1 - (1 - rng.random()) ** (1 / len(self.idle)))
+            self.candidates_scanned += 1
+        
+        while self.free:
+            work_time, i, emp = self.free[0]
+            if (work_time / 10) * work_time_weight >= min_score:
+                break
+            entry = heapq.heappop(self.free)
+            
+            # Departures are not always requested in time order; an employee
+            # who is busy until later waits to be released again
+            if start < emp.available_after:
+                self.candidates_scanned += 1
+                heapq.heappush(self.waiting, (emp.available_after, i, emp))
+                continue
+            scanned.append(entry)
+            if emp.over_limit(end - start):
+                continue
+            self.conflict_checks += 1
+            if emp.busy.overlaps(start, end):
+                continue
+            
+            total_score = (work_time / 10) * work_time_weight + variety_score(emp) + rng.random() * 5
+            if total_score < min_score:
+                min_score = total_score
+                best = scanned[-1]
+        
+        self.candidates_scanned += len(scanned)
+        for entry in scanned:
+            if entry is not best:
+                heapq.heappush(self.free, entry)
+        if best is not None and self.idle and best is self.idle[-1]:
+            self.idle.pop()
+        return best[2] if best else None
+
+    def assign(self, emp, start, end):
+        """Book [start, end) for an employee returned by pick()"""
+        emp.busy.add(start, end)
+        emp.available_after = end
+        emp.total_work_time += end - start
+        heapq.heappush(self.waiting, (end, self._positions[id(emp)], emp))
+
+    def _index_gaps(self):
+        # Each employee is free before its first trip, between trips and after its last
+        self.pending_gaps = []
+        for _, i, emp in self.free + self.waiting + self.idle:
+            gap_start = -math.inf
+            for busy_start, busy_end in zip(emp.busy.starts, emp.busy.ends):
+                self.pending_gaps.append((gap_start, i, busy_start, emp))
+                gap_start = busy_end
+            self.pending_gaps.append((gap_start, i, math.inf, emp))
+        heapq.heapify(self.pending_gaps)
+        self.open_gaps = []
+
+    def pick_least_loaded(self, start, end):
+        """Pop the employee with the least work time who has no conflict with
+        [start, end) and room under work_limit, ignoring available_after (the
+        relaxed second pass).
+        
+        Gaps open once a request starts inside them, so only employees free
+        at start are looked at. Requests are expected in start-time order;
+        an earlier start rebuilds the gap index.
+        """
+        if self.pending_gaps is None or start < self.gap_time:
+            self._index_gaps()
+        self.gap_time = start
+        while self.pending_gaps and self.pending_gaps[0][0] <= start:
+            gap_start, i, gap_end, emp = heapq.heappop(self.pending_gaps)
+            heapq.heappush(self.open_gaps, (emp.total_work_time, i, gap_start, gap_end, emp))
+        
+        skipped = []
+        chosen = None
+        while self.open_gaps:
+            entry = heapq.heappop(self.open_gaps)
+            gap_end, emp = entry[3], entry[4]
+            if gap_end <= start:
+                # Later requests start later still, so this gap can never fit one
+                continue
+            self.candidates_scanned += 1
+            self.conflict_checks += 1
+            if gap_end < end or emp.over_limit(end - start):
+                skipped.append(entry)
+            else:
+                chosen = entry
+                break
+        
+        for entry in skipped:
+            heapq.heappush(self.open_gaps, entry)
+        self._chosen_gap_end = chosen[3] if chosen else None
+        return chosen[4] if chosen else None
+
+    def assign_relaxed(self, emp, start, end):
+        """Book [start, end) for an employee returned by pick_least_loaded()"""
+        emp.busy.add(start, end)
+        emp.total_work_time += end - start
+        # The rest of the chosen gap opens again when the trip ends
+        heapq.heappush(self.pending_gaps, (end, self._positions[id(emp)], self._chosen_gap_end, emp))
+
+class SchedulerStats:
+    """Timings and counters collected while scheduling.
+    
+    Pass one instance as stats= to the pipeline functions, then read its
+    fields or export it with to_dict() / to_json().
+    """
+    def __init__(self):
+        self.phase_seconds = {}  # Wall time per phase, summed over attempts
+        self.candidates_scanned = 0  # Employees considered for a departure
+        self.conflict_checks = 0  # Interval-index overlap queries
+        self.second_pass = {"morning": 0, "evening": 0}  # Departures left for the relaxed pass
+        self.attempts = []  # One outcome dict per try_assign_employees run
+        self.shards = {}  # Per-depot summary from solve_sharded
+        self.improvement = {}  # Local-search summary from improve_schedule
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + time.perf_counter() - started
+
+    def merge(self, other):
+        """Add another run's numbers, e.g. from a portfolio worker"""
+        for name, seconds in other.phase_seconds.items():
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+        self.candidates_scanned += other.candidates_scanned
+        self.conflict_checks += other.conflict_checks
+        for shift, count in other.second_pass.items():
+            self.second_pass[shift] = self.second_pass.get(shift, 0) + count
+        self.attempts.extend(other.attempts)
+        self.shards.update(other.shards)
+        self.improvement.update(other.improvement)
+
+    def to_dict(self):
+        return {
+            "phase_seconds": dict(self.phase_seconds),
+            "candidates_scanned": self.candidates_scanned,
+            "conflict_checks": self.conflict_checks,
+            "second_pass": dict(self.second_pass),
+            "attempts": [dict(a) for a in self.attempts],
+            "shards": {str(depot): dict(summary) for depot, summary in self.shards.items()},
+            "improvement": dict(self.improvement),
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+def _phase(stats, name):
+    """Time a block into stats when stats are being collected"""
+    return stats.phase(name) if stats is not None else contextlib.nullcontext()
 
 # Constants
 WORK_START = "06:00"
@@ -43,320 +363,1092 @@ PEAK_HOURS = [(8, 10, 30), (17, 20, 30)]
 REQUIRED_WORK_TIME = 420
 MORNING_SHIFT = (6, 14)
 EVENING_SHIFT = (14, 25)
+MINUTES_PER_DAY = 24 * 60
+DAYS_PER_WEEK = 7
+MIN_REST_MINUTES = 11 * 60  # Between one day's last trip and the next day's first
+MAX_WEEKLY_MINUTES = 48 * 60
+
+# Timeline helpers
+# All times are integer minutes since midnight at the start of the service day.
+# Clock times before WORK_START belong to the next calendar day, so "01:00" is
+# 25 * 60 -- the same convention EVENING_SHIFT uses for its end hour.
+
+def parse_time(time_str, day_start=None):
+    """Convert "HH:MM" to minutes on the service-day timeline"""
+    hours, minutes = time_str.split(":")
+    value = int(hours) * 60 + int(minutes)
+    if day_start is None:
+        day_start = SERVICE_START
+    if value < day_start:
+        value += MINUTES_PER_DAY
+    return value
+
+def format_time(minutes):
+    """Convert service-day minutes back to a "HH:MM" clock string"""
+    return f"{(minutes // 60) % 24:02d}:{minutes % 60:02d}"
+
+def clock_hour(minutes):
+    """Hour shown on the clock at the given service-day minute"""
+    return (minutes // 60) % 24
+
+def is_morning(minutes):
+    return MORNING_SHIFT[0] * 60 <= minutes < MORNING_SHIFT[1] * 60
 
-def generate_schedule(routes, start_time="06:00"):
-    # Create a master schedule with all possible time slots
-    current_time = datetime.strptime(start_time, "%H:%M")
-    end_time = datetime.strptime(WORK_END, "%H:%M") + timedelta(days=1)
+SERVICE_START = parse_time(WORK_START, day_start=0)
+SERVICE_END = parse_time(WORK_END)
+
+def is_peak(minutes):
+    hour = clock_hour(minutes)
+    return any(peak_start <= hour < peak_end for peak_start, peak_end, _ in PEAK_HOURS)
+
+def _slot_grid(start, end):
+    """Precompute the departure slots between start and end and whether each is in a peak hour"""
+    slots = []
+    slot_peak = []
+    current_time = start
+    while current_time < end:
+        # Slots are 10 minutes apart, or peak_min // 2 inside a peak window
+        interval = 10
+        hour = clock_hour(current_time)
+        in_peak = False
+        for peak_start, peak_end, peak_min in PEAK_HOURS:
+            if peak_start <= hour < peak_end:
+                interval = peak_min // 2
+                in_peak = True
+        slots.append(current_time)
+        slot_peak.append(in_peak)
+        current_time += interval
+    return slots, slot_peak
+
+def iter_departures(routes, start_time="06:00", snap_to_slots=True):
+    """Yield (departure_time, route) pairs in chronological order.
+
+    Routes sit in a min-heap keyed on when they are next due, so the work done
+    is proportional to the number of departures. With snap_to_slots each
+    departure is moved to the first slot at or after its due time, as the
+    original slot scan did; otherwise routes depart exactly on their headway.
+    """
+    start = parse_time(start_time, day_start=0)
+    end = SERVICE_END
+    if snap_to_slots:
+        slots, slot_peak = _slot_grid(start, end)
     
+    # (next due time, index into routes) -- already a valid heap
+    heap = [(start, i) for i in range(len(routes))]
+    while heap:
+        due, i = heap[0]
+        if snap_to_slots:
+            k = bisect_left(slots, due)
+            if k == len(slots):
+                heapq.heappop(heap)
+                continue
+            departure_time = slots[k]
+            in_peak = slot_peak[k]
+        else:
+            if due >= end:
+                heapq.heappop(heap)
+                continue
+            departure_time = due
+            in_peak = is_peak(due)
+        
+        route = routes[i]
+        yield departure_time, route
+        
+        # Routes run more frequently during peak hours
+        peak_factor = 0.7 if in_peak else 1.0
+        adjusted_frequency = max(10, int(route.frequency * peak_factor))
+        heapq.heapreplace(heap, (departure_time + adjusted_frequency, i))
+
+class TimetableCache:
+    """LRU cache of departure timetables.
+    
+    A timetable depends only on the route frequency, the peak configuration,
+    the service window and the snapping mode, so routes in the same priority
+    bucket share one entry across runs and depots. Timetables are stored as
+    tuples of service-day minutes.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            timetable = self._entries.get(key)
+            if timetable is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return timetable
+
+    def put(self, key, timetable):
+        with self._lock:
+            self._entries[key] = timetable
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+# Shared by every generate_schedule call in this process
+TIMETABLE_CACHE = TimetableCache()
+
+def timetable_key(frequency, start, snap_to_slots):
+    return (frequency, tuple(tuple(peak) for peak in PEAK_HOURS), start, SERVICE_END, snap_to_slots)
+
+def generate_schedule(routes, start_time="06:00", snap_to_slots=True, vectorized=False, stats=None,
+                      use_cache=True):
+    with _phase(stats, "generate"):
+        return _generate_schedule(routes, start_time, snap_to_slots, vectorized, use_cache)
+
+def _generate_schedule(routes, start_time, snap_to_slots, vectorized, use_cache):
     # Reset route schedules
     for route in routes:
         route.schedule = []
         route.last_assigned_time = None
     
-    # Create a dictionary to track when each route should be scheduled next
-    next_schedule_time = {route.route_id: current_time for route in routes}
-    
-    # Process all time slots in chronological order
-    while current_time < end_time:
-        # Determine the time interval to the next slot
-        interval = 10
-        for peak_start, peak_end, peak_min in PEAK_HOURS:
-            if peak_start <= current_time.hour < peak_end:
-                interval = peak_min // 2
+    if use_cache and not vectorized:
+        start = parse_time(start_time, day_start=0)
+        groups = {}
+        for route in routes:
+            groups.setdefault(timetable_key(route.frequency, start, snap_to_slots), []).append(route)
         
-        time_slot = current_time.strftime("%H:%M")
+        # Generate only the timetables the cache does not have yet, one route per key
+        missing = {}
+        for key, group in groups.items():
+            timetable = TIMETABLE_CACHE.get(key)
+            if timetable is None:
+                missing[key] = group[0]
+            else:
+                for route in group:
+                    route.schedule = list(timetable)
+        if missing:
+            generate_schedule(list(missing.values()), start_time, snap_to_slots, use_cache=False)
+            for key, representative in missing.items():
+                TIMETABLE_CACHE.put(key, tuple(representative.schedule))
+                for route in groups[key]:
+                    route.schedule = list(representative.schedule)
         
-        # Check which routes should be scheduled at this time
         for route in routes:
-            # If it's time to schedule this route
-            if current_time >= next_schedule_time[route.route_id]:
-                # Add to schedule
-                route.schedule.append(time_slot)
-                route.last_assigned_time = time_slot
-                
-                # Calculate when to schedule this route next
-                # During peak hours, potentially decrease the interval
-                peak_factor = 1.0
-                for peak_start, peak_end, _ in PEAK_HOURS:
-                    if peak_start <= current_time.hour < peak_end:
-                        # Routes run more frequently during peak hours
-                        peak_factor = 0.7
-                        break
-                
-                # Set the next time to schedule this route
-                adjusted_frequency = max(10, int(route.frequency * peak_factor))
-                next_schedule_time[route.route_id] = current_time + timedelta(minutes=adjusted_frequency)
-        # Move to next time slot
-        current_time += timedelta(minutes=interval)
+            route.last_assigned_time = route.schedule[-1] if route.schedule else None
+        return routes
+    
+    if vectorized:
+        frequencies = [route.frequency for route in routes]
+        route_index, departure_times = vectorized_departures(frequencies, start_time, snap_to_slots)
+        _store_timetables(routes, route_index, departure_times)
+        return routes
+    
+    for departure_time, route in iter_departures(routes, start_time, snap_to_slots):
+        route.schedule.append(departure_time)
+        route.last_assigned_time = departure_time
     
     return routes
 
-def calculate_required_employees(routes):
-    total_morning_minutes = 0
-    total_evening_minutes = 0
+def max_overlap(intervals):
+    """Largest number of [start, end) intervals in progress at the same minute.
+
+    This is the interval-partitioning number: the fewest drivers that can
+    cover all the intervals without any of them being double-booked.
+    """
+    events = []
+    for start, end in intervals:
+        events.append((start, 1))
+        events.append((end, -1))
+    # At equal times the -1 sorts first, so back-to-back trips share a driver
+    events.sort()
     
-    # First generate a priority-based schedule
-    routes = generate_schedule(routes)
+    in_progress = 0
+    peak = 0
+    for _, delta in events:
+        in_progress += delta
+        if in_progress > peak:
+            peak = in_progress
+    return peak
+
+def required_employee_bounds(routes, work_time_cap=None):
+    """Heuristic and exact minimum staffing per shift for already scheduled routes.
+    
+    Returns {"morning": (heuristic, minimum), "evening": (heuristic, minimum)}.
+    The minimum is the peak overlap of the shift's departures, raised to
+    ceil(total minutes / work_time_cap) when a cap is given.
+    """
+    shift_minutes = {"morning": 0, "evening": 0}
+    shift_intervals = {"morning": [], "evening": []}
     
     for route in routes:
         for departure_time in route.schedule:
-            dt = datetime.strptime(departure_time, "%H:%M")
-            total_work_minutes = route.estimated_time
-            if MORNING_SHIFT[0] <= dt.hour < MORNING_SHIFT[1]:
-                total_morning_minutes += total_work_minutes
-            else:
-                total_evening_minutes += total_work_minutes
+            shift = "morning" if is_morning(departure_time) else "evening"
+            shift_minutes[shift] += route.estimated_time
+            shift_intervals[shift].append((departure_time, departure_time + route.estimated_time))
     
     # Increase the number of employees to ensure all routes are covered
     # Use a smaller divisor to calculate more employees than strictly necessary
     adjusted_required_work_time = REQUIRED_WORK_TIME * 0.9  # Add 10% buffer
     
-    morning_employees = math.ceil(total_morning_minutes / adjusted_required_work_time)
-    evening_employees = math.ceil(total_evening_minutes / adjusted_required_work_time)
+    bounds = {}
+    for shift in ("morning", "evening"):
+        heuristic = math.ceil(shift_minutes[shift] / adjusted_required_work_time)
+        minimum = max_overlap(shift_intervals[shift])
+        if work_time_cap:
+            minimum = max(minimum, math.ceil(shift_minutes[shift] / work_time_cap))
+        bounds[shift] = (heuristic, minimum)
+    return bounds
+
+def calculate_required_employees(routes, exact=False, work_time_cap=None, vectorized=False, stats=None):
+    if vectorized:
+        return _calculate_required_employees_vectorized(routes, exact, work_time_cap, stats)
+    
+    # First generate a priority-based schedule
+    routes = generate_schedule(routes, vectorized=vectorized, stats=stats)
+    
+    # With exact=True staff each shift at its proven minimum instead of the
+    # work-time heuristic
+    with _phase(stats, "staffing"):
+        bounds = required_employee_bounds(routes, work_time_cap)
+    pick = 1 if exact else 0
+    morning_employees = bounds["morning"][pick]
+    evening_employees = bounds["evening"][pick]
     return morning_employees, evening_employees, routes
 
-def assign_employees(routes, employees, max_retries=3):
+# Vectorized NumPy path
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("NumPy is required for the vectorized scheduling helpers")
+
+def frequencies_from_priorities(priorities):
+    """Route._calculate_frequency for an array of priorities"""
+    _require_numpy()
+    normalized_priority = np.clip(np.asarray(priorities, dtype=np.float64), 1, 10)
+    return (40 - ((normalized_priority - 1) / 9) * 30).astype(np.int64)
+
+def _minute_lookups(start, end, snap_to_slots):
+    """Per-minute arrays over [0, end]: the minute a route due then actually
+    departs (end meaning no departure) and whether that minute is peak"""
+    minutes = np.arange(end + 1)
+    if snap_to_slots:
+        slots, slot_peak = _slot_grid(start, end)
+        slots = np.asarray(slots + [end], dtype=np.int64)
+        slot_peak = np.asarray(slot_peak + [False])
+        k = np.searchsorted(slots, minutes, side="left")
+        return slots[k], slot_peak[k]
+    
+    hours = (minutes // 60) % 24
+    peak = np.zeros(end + 1, dtype=bool)
+    for peak_start, peak_end, _ in PEAK_HOURS:
+        peak |= (peak_start <= hours) & (hours < peak_end)
+    return minutes, peak
+
+def vectorized_departures(frequencies, start_time="06:00", snap_to_slots=True):
+    """Departure times for many routes at once, as NumPy arrays.
+    
+    All routes step forward one departure at a time together, using
+    per-minute snap and peak lookups, so the Python loop runs once per
+    departure of the busiest route. Returns (route_index, departure_time)
+    int arrays sorted by route then time, matching generate_schedule().
+    """
+    _require_numpy()
+    frequencies = np.asarray(frequencies, dtype=np.int64)
+    start = parse_time(start_time, day_start=0)
+    end = SERVICE_END
+    if start >= end or len(frequencies) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    departs_at, peak = _minute_lookups(start, end, snap_to_slots)
+    
+    # Routes run more frequently during peak hours
+    off_peak_headway = np.maximum(10, frequencies)
+    peak_headway = np.maximum(10, (frequencies * 0.7).astype(np.int64))
+    
+    active = np.arange(len(frequencies))
+    due = np.full(len(frequencies), start, dtype=np.int64)
+    route_steps = []
+    time_steps = []
+    while active.size:
+        times = departs_at[np.minimum(due, end)]
+        running = times < end
+        active = active[running]
+        times = times[running]
+        route_steps.append(active)
+        time_steps.append(times)
+        due = times + np.where(peak[times], peak_headway[active], off_peak_headway[active])
+    
+    route_index = np.concatenate(route_steps)
+    departure_time = np.concatenate(time_steps)
+    order = np.lexsort((departure_time, route_index))
+    return route_index[order], departure_time[order]
+
+def _store_timetables(routes, route_index, departure_times):
+    """Copy vectorized_departures() output into each route's schedule list"""
+    # Results are grouped by route, so each route's timetable is one slice
+    bounds = np.searchsorted(route_index, np.arange(len(routes) + 1))
+    for i, route in enumerate(routes):
+        route.schedule = departure_times[bounds[i]:bounds[i + 1]].tolist()
+        route.last_assigned_time = route.schedule[-1] if route.schedule else None
+
+def _morning_mask(departure_times):
+    return (departure_times >= MORNING_SHIFT[0] * 60) & (departure_times < MORNING_SHIFT[1] * 60)
+
+def workload_histograms(route_index, departure_times, estimated_times):
+    """Workload minutes of vectorized departures, per shift and per hour.
+    
+    Returns {"morning": minutes, "evening": minutes, "hourly": array} where
+    hourly[h] sums the trips starting in hour h of the service day (24 and
+    up are after midnight).
+    """
+    _require_numpy()
+    minutes = np.asarray(estimated_times, dtype=np.int64)[route_index]
+    morning = _morning_mask(departure_times)
+    hourly = np.bincount(departure_times // 60, weights=minutes, minlength=SERVICE_END // 60 + 1)
+    return {
+        "morning": int(minutes[morning].sum()),
+        "evening": int(minutes[~morning].sum()),
+        "hourly": hourly.astype(np.int64),
+    }
+
+def priority_sweep(priority_sets, estimated_times, start_time="06:00"):
+    """Heuristic staffing for many priority configurations of the same routes.
+    
+    priority_sets is an (n_configs, n_routes) array of avg_priority values.
+    All configurations are generated in a single vectorized run. Returns an
+    (n_configs, 2) array of (morning, evening) employees, computed the same
+    way as calculate_required_employees().
+    """
+    _require_numpy()
+    priority_sets = np.atleast_2d(np.asarray(priority_sets, dtype=np.float64))
+    n_configs, n_routes = priority_sets.shape
+    frequencies = frequencies_from_priorities(priority_sets.ravel())
+    route_index, departure_times = vectorized_departures(frequencies, start_time)
+    
+    minutes = np.tile(np.asarray(estimated_times, dtype=np.int64), n_configs)[route_index]
+    config = route_index // n_routes
+    morning = _morning_mask(departure_times)
+    morning_minutes = np.bincount(config[morning], weights=minutes[morning], minlength=n_configs)
+    evening_minutes = np.bincount(config[~morning], weights=minutes[~morning], minlength=n_configs)
+    
+    adjusted_required_work_time = REQUIRED_WORK_TIME * 0.9
+    staffing = np.stack([morning_minutes, evening_minutes], axis=1) / adjusted_required_work_time
+    return np.ceil(staffing).astype(np.int64)
+
+def _calculate_required_employees_vectorized(routes, exact, work_time_cap, stats):
+    """calculate_required_employees() on the vectorized departure arrays.
+    
+    Shift minutes come from workload_histograms(); only the exact bound
+    still sweeps the shift's intervals in Python.
+    """
+    with _phase(stats, "generate"):
+        route_index, departure_times = vectorized_departures([route.frequency for route in routes])
+        _store_timetables(routes, route_index, departure_times)
+    
+    with _phase(stats, "staffing"):
+        estimated_times = np.asarray([route.estimated_time for route in routes], dtype=np.int64)
+        workload = workload_histograms(route_index, departure_times, estimated_times)
+        adjusted_required_work_time = REQUIRED_WORK_TIME * 0.9  # Same 10% buffer as required_employee_bounds
+        staffing = {}
+        morning = _morning_mask(departure_times)
+        for shift, in_shift in (("morning", morning), ("evening", ~morning)):
+            if not exact:
+                staffing[shift] = math.ceil(workload[shift] / adjusted_required_work_time)
+                continue
+            starts = departure_times[in_shift]
+            ends = starts + estimated_times[route_index[in_shift]]
+            minimum = max_overlap(zip(starts.tolist(), ends.tolist()))
+            if work_time_cap:
+                minimum = max(minimum, math.ceil(workload[shift] / work_time_cap))
+            staffing[shift] = minimum
+    return staffing["morning"], staffing["evening"], routes
+
+def assign_employees(routes, employees, max_retries=3, seed=None, stats=None, improve_budget=0):
     # Try multiple assignment strategies if needed
     for retry in range(max_retries):
-        schedule, morning_assigned, morning_total, evening_assigned, evening_total = try_assign_employees(
-            routes, employees, retry_strategy=retry
-        )
+        result = try_assign_employees(routes, employees, retry_strategy=retry, seed=seed, stats=stats)
+        _, morning_assigned, morning_total, evening_assigned, evening_total = result
         
         # If we've achieved full assignment, return the results
         if morning_assigned == morning_total and evening_assigned == evening_total:
             print(f"Full assignment achieved on attempt {retry+1}")
-            return schedule, morning_assigned, morning_total, evening_assigned, evening_total
+            break
+    else:
+        # If we've tried all strategies and still haven't fully assigned, return the best result
+        print(f"Could not achieve full assignment after {max_retries} attempts")
     
-    # If we've tried all strategies and still haven't fully assigned, return the best result
-    print(f"Could not achieve full assignment after {max_retries} attempts")
-    return schedule, morning_assigned, morning_total, evening_assigned, evening_total
+    # Optionally spend a fixed time budget polishing the greedy result
+    if improve_budget > 0:
+        result = improve_schedule(routes, employees, result, time_budget=improve_budget, seed=seed, stats=stats)
+    return result
+
+def score_schedule(result):
+    """Score an assignment result; lower is better.
+    
+    Returns (unassigned departures, balance penalty). The balance penalty is
+    the work-time spread (max - min minutes) within each shift plus 20
+    minutes for every time a driver repeats a route they already drove.
+    """
+    schedule, morning_assigned, morning_total, evening_assigned, evening_total = result
+    unassigned = (morning_total - morning_assigned) + (evening_total - evening_assigned)
+    
+    shift_minutes = {"morning": [], "evening": []}
+    repeats = 0
+    for data in schedule.values():
+        if not data["routes"]:
+            continue
+        minutes = sum(end - start for _, start, end in data["routes"])
+        shift = "morning" if is_morning(data["routes"][0][1]) else "evening"
+        shift_minutes[shift].append(minutes)
+        repeats += len(data["routes"]) - len({route_id for route_id, _, _ in data["routes"]})
+    
+    spread = sum(max(m) - min(m) for m in shift_minutes.values() if m)
+    return unassigned, spread + 20 * repeats
+
+# Routes and employees shared with portfolio worker processes, sent once per worker
+_portfolio_routes = None
+_portfolio_employees = None
+
+def _init_portfolio_worker(routes, employees):
+    global _portfolio_routes, _portfolio_employees
+    _portfolio_routes = routes
+    _portfolio_employees = employees
 
-def try_assign_employees(routes, employees, retry_strategy=0):
+def _portfolio_task(task):
+    strategy, seed, collect_stats = task
+    stats = SchedulerStats() if collect_stats else None
+    result = try_assign_employees(_portfolio_routes, _portfolio_employees, retry_strategy=strategy, seed=seed,
+                                  stats=stats)
+    return strategy, seed, result, stats
+
+def assign_employees_portfolio(routes, employees, seeds=4, strategies=(0, 1, 2), seed=0, max_workers=None,
+                               stats=None):
+    """Run every retry strategy with several seeds in parallel and keep the best result.
+    
+    Attempt k of each strategy uses seed + k, so the same arguments always
+    produce the same schedule. Results are ranked with score_schedule(), and
+    ties go to the lowest strategy and seed. max_workers=1 runs in-process.
+    """
+    tasks = [(strategy, seed + k, stats is not None) for strategy in strategies for k in range(seeds)]
+    
+    if max_workers == 1:
+        _init_portfolio_worker(routes, employees)
+        outcomes = [_portfolio_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_portfolio_worker,
+                                 initargs=(routes, employees)) as executor:
+            outcomes = list(executor.map(_portfolio_task, tasks))
+    
+    if stats is not None:
+        for outcome in outcomes:
+            stats.merge(outcome[3])
+    
+    best_strategy, best_seed, best, _ = min(outcomes, key=lambda o: (score_schedule(o[2]), o[0], o[1]))
+    print(f"Best of {len(tasks)} attempts: strategy {best_strategy}, seed {best_seed}")
+    
+    # Worker processes mutated their own copies, so bring work totals in line with the winner
+    schedule = best[0]
+    for emp in employees:
+        emp.total_work_time = sum(end - start for _, start, end in schedule[emp.emp_id]["routes"])
+    return best
+
+def try_assign_employees(routes, employees, retry_strategy=0, seed=None, stats=None):
+    started = time.perf_counter()
+    # A seeded generator makes the tie-breaking noise reproducible
+    rng = random.Random(seed) if seed is not None else random
     schedule = {emp.emp_id: {"name": emp.name, "routes": []} for emp in employees}
     morning_employees = [e for e in employees if e.shift == "morning"]
     evening_employees = [e for e in employees if e.shift == "evening"]
     
-    # Create a list of all departure times
-    all_departures = []
+    with _phase(stats, "departure_table"):
+        departures = DepartureTable(routes)
     
-    # Track which departures have already been assigned
-    assigned_departures = set()
+    # Track which departures have already been assigned, by departure id
+    assigned_departures = bytearray(len(departures))
     
-    for route in routes:
-        for departure_time in route.schedule:
-            dt = datetime.strptime(departure_time, "%H:%M")
-            
-            # Create a unique identifier for this route+time combination
-            departure_id = f"{route.route_id}_{departure_time}"
-            
-            # Only add if not already assigned
-            if departure_id not in assigned_departures:
-                all_departures.append({
-                    "route": route,
-                    "departure_time": departure_time,
-                    "dt": dt,
-                    "end_time": dt + timedelta(minutes=route.estimated_time),
-                    "duration": route.estimated_time,
-                    "departure_id": departure_id,
-                    "priority": route.avg_priority  # Add priority for sorting
-                })
-    
-    # Sort all departures based on strategy
+    # Sort departures based on strategy; the split into shifts is already done
+    start = departures.start
+    end = departures.end
+    route_index = departures.route_index
     if retry_strategy == 0:
         # Default: Sort by time
-        all_departures.sort(key=lambda d: d["dt"])
+        sort_key = start.__getitem__
     elif retry_strategy == 1:
         # Strategy 1: Sort by priority then time
-        all_departures.sort(key=lambda d: (-d["priority"], d["dt"]))
+        priorities = [route.avg_priority for route in routes]
+        sort_key = lambda d: (-priorities[route_index[d]], start[d])
     else:
         # Strategy 2: Sort by time but prioritize routes with fewer departures
-        route_counts = {}
-        for d in all_departures:
-            route_id = d["route"].route_id
-            if route_id not in route_counts:
-                route_counts[route_id] = 0
-            route_counts[route_id] += 1
-        
-        # Add count to each departure
-        for d in all_departures:
-            d["route_count"] = route_counts[d["route"].route_id]
-        
-        # Sort by route count (ascending), then time
-        all_departures.sort(key=lambda d: (d["route_count"], d["dt"]))
-    
-    # Split into morning and evening departures
-    morning_departures = [d for d in all_departures if MORNING_SHIFT[0] <= d["dt"].hour < MORNING_SHIFT[1]]
-    evening_departures = [d for d in all_departures if d not in morning_departures]
+        route_counts = [len(route.schedule) for route in routes]
+        sort_key = lambda d: (route_counts[route_index[d]], start[d])
+    with _phase(stats, "departure_sort"):
+        morning_departures = sorted(departures.morning, key=sort_key)
+        evening_departures = sorted(departures.evening, key=sort_key)
+
+    # Score weights per retry strategy: (work_time_weight, variety_weight)
+    if retry_strategy == 0:
+        work_time_weight, variety_weight = 1.0, 2.0
+    elif retry_strategy == 1:
+        # Reduce variety penalty to assign more routes
+        work_time_weight, variety_weight = 0.5, 1.0
+    else:
+        # Focus more on balancing work time
+        work_time_weight, variety_weight = 2.0, 0.5
 
-    def assign_shift_departures(shift_employees, shift_departures):
+    def assign_shift_departures(shift, shift_employees, shift_departures):
         assigned_count = 0
         total_count = len(shift_departures)
         
         # Initialize employee availability
         for emp in shift_employees:
-            emp.available_after = datetime.strptime(WORK_START, "%H:%M")
-            emp.total_work_time = 0  # Reset work time
+            emp.clear_day()
+        pool = AvailabilityPool(shift_employees)
         
-        # Track route variety per employee
+        # Track route variety per employee, keyed by route index
         employee_route_counts = {emp.emp_id: {} for emp in shift_employees}
         
-        # First pass: try to assign all departures
-        unassigned_departures = []
-        for departure in shift_departures:
-            assigned_employee = None
-            min_score = float('inf')
+        def record(emp, departure):
+            ri = route_index[departure]
+            schedule[emp.emp_id]["routes"].append((routes[ri].route_id, start[departure], end[departure]))
             
-            # Skip if this departure has already been assigned
-            if departure["departure_id"] in assigned_departures:
-                continue
-                
-            route_id = departure["route"].route_id
-            current_time = departure["dt"]
+            # Mark this departure as assigned
+            assigned_departures[departure] = 1
             
-            for emp in shift_employees:
-                # Skip if employee is not available yet
-                if emp.available_after and current_time < emp.available_after:
+            # Update route variety tracking
+            route_counts = employee_route_counts[emp.emp_id]
+            route_counts[ri] = route_counts.get(ri, 0) + 1
+        
+        # First pass: try to assign all departures
+        unassigned_departures = []
+        with _phase(stats, "first_pass"):
+            for departure in shift_departures:
+                # Skip if this departure has already been assigned
+                if assigned_departures[departure]:
                     continue
-                
-                # Check for schedule conflicts
-                has_conflict = False
-                for assigned in schedule[emp.emp_id]["routes"]:
-                    assigned_start = datetime.strptime(assigned[1], "%H:%M")
-                    assigned_end = datetime.strptime(assigned[2], "%H:%M")
-                    if not (departure["end_time"] <= assigned_start or current_time >= assigned_end):
-                        has_conflict = True
-                        break
-                
-                if not has_conflict:
-                    # Calculate score based on work time and route variety
-                    route_count = employee_route_counts[emp.emp_id].get(route_id, 0)
-                    
-                    # Adjust weights based on retry strategy
-                    if retry_strategy == 0:
-                        work_time_weight = 1.0
-                        variety_weight = 2.0
-                    elif retry_strategy == 1:
-                        work_time_weight = 0.5
-                        variety_weight = 1.0  # Reduce variety penalty to assign more routes
-                    else:
-                        # Focus more on balancing work time
-                        work_time_weight = 2.0
-                        variety_weight = 0.5
                     
-                    work_time_score = (emp.total_work_time / 10) * work_time_weight 
-                    variety_score = route_count * 20 * variety_weight
-                    
-                    # Add a small random factor to break ties
-                    random_factor = random.random() * 5
-                    
-                    total_score = work_time_score + variety_score + random_factor
-                    
-                    # Prefer employees with lower scores
-                    if total_score < min_score:
-                        min_score = total_score
-                        assigned_employee = emp
-            
-            if assigned_employee:
-                # Update schedule and employee work time
-                schedule[assigned_employee.emp_id]["routes"].append((
-                    departure["route"].route_id,
-                    current_time.strftime("%H:%M"),
-                    departure["end_time"].strftime("%H:%M")
-                ))
+                ri = route_index[departure]
                 
-                # Update employee availability
-                assigned_employee.available_after = departure["end_time"]
-                assigned_employee.total_work_time += departure["duration"]
-                assigned_count += 1
+                def variety_score(emp):
+                    # Penalize drivers who already drove this route
+                    return employee_route_counts[emp.emp_id].get(ri, 0) * 20 * variety_weight
                 
-                # Mark this departure as assigned
-                assigned_departures.add(departure["departure_id"])
-                
-                # Update route variety tracking
-                if route_id not in employee_route_counts[assigned_employee.emp_id]:
-                    employee_route_counts[assigned_employee.emp_id][route_id] = 0
-                employee_route_counts[assigned_employee.emp_id][route_id] += 1
-            else:
-                # If couldn't assign, add to unassigned list for second pass
-                unassigned_departures.append(departure)
+                assigned_employee = pool.pick(start[departure], end[departure], work_time_weight, variety_score, rng)
+                if assigned_employee:
+                    pool.assign(assigned_employee, start[departure], end[departure])
+                    record(assigned_employee, departure)
+                    assigned_count += 1
+                else:
+                    # If couldn't assign, add to unassigned list for second pass
+                    unassigned_departures.append(departure)
+        
+        if stats is not None:
+            stats.second_pass[shift] += len(unassigned_departures)
         
         # Second pass: try to assign remaining departures with more relaxed constraints
         if unassigned_departures:
             print(f"Attempting to assign {len(unassigned_departures)} unassigned departures in second pass")
-            
-            # Sort unassigned departures by time
-            unassigned_departures.sort(key=lambda d: d["dt"])
-            
-            for departure in unassigned_departures:
-                # Skip if this departure has already been assigned
-                if departure["departure_id"] in assigned_departures:
-                    continue
-                    
-                route_id = departure["route"].route_id
-                current_time = departure["dt"]
-                
-                # Find employee with least work time
-                available_employees = sorted(shift_employees, key=lambda e: e.total_work_time)
+            with _phase(stats, "second_pass"):
+                # Sort unassigned departures by time
+                unassigned_departures.sort(key=start.__getitem__)
                 
-                for emp in available_employees:
-                    # Check for schedule conflicts
-                    has_conflict = False
-                    for assigned in schedule[emp.emp_id]["routes"]:
-                        assigned_start = datetime.strptime(assigned[1], "%H:%M")
-                        assigned_end = datetime.strptime(assigned[2], "%H:%M")
-                        if not (departure["end_time"] <= assigned_start or current_time >= assigned_end):
-                            has_conflict = True
-                            break
+                for departure in unassigned_departures:
+                    # Skip if this departure has already been assigned
+                    if assigned_departures[departure]:
+                        continue
                     
-                    if not has_conflict:
-                        # Assign to this employee
-                        schedule[emp.emp_id]["routes"].append((
-                            departure["route"].route_id,
-                            current_time.strftime("%H:%M"),
-                            departure["end_time"].strftime("%H:%M")
-                        ))
-                        
-                        # Update employee work time
-                        emp.total_work_time += departure["duration"]
+                    # Employee with least work time and no conflicting trip
+                    emp = pool.pick_least_loaded(start[departure], end[departure])
+                    if emp:
+                        pool.assign_relaxed(emp, start[departure], end[departure])
+                        record(emp, departure)
                         assigned_count += 1
-                        
-                        # Mark this departure as assigned
-                        assigned_departures.add(departure["departure_id"])
-                        
-                        # Update route variety tracking
-                        if route_id not in employee_route_counts[emp.emp_id]:
-                            employee_route_counts[emp.emp_id][route_id] = 0
-                        employee_route_counts[emp.emp_id][route_id] += 1
-                        
-                        break
         
+        if stats is not None:
+            stats.candidates_scanned += pool.candidates_scanned
+            stats.conflict_checks += pool.conflict_checks
         return assigned_count, total_count
 
-    morning_assigned, morning_total = assign_shift_departures(morning_employees, morning_departures)
-    evening_assigned, evening_total = assign_shift_departures(evening_employees, evening_departures)
+    morning_assigned, morning_total = assign_shift_departures("morning", morning_employees, morning_departures)
+    evening_assigned, evening_total = assign_shift_departures("evening", evening_employees, evening_departures)
 
     # Sort each employee's routes by start time
     for emp_id in schedule:
-        schedule[emp_id]["routes"].sort(key=lambda r: datetime.strptime(r[1], "%H:%M"))
+        schedule[emp_id]["routes"].sort(key=lambda r: r[1])
+    
+    if stats is not None:
+        stats.attempts.append({
+            "strategy": retry_strategy,
+            "seed": seed,
+            "morning_assigned": morning_assigned,
+            "morning_total": morning_total,
+            "evening_assigned": evening_assigned,
+            "evening_total": evening_total,
+            "seconds": time.perf_counter() - started,
+        })
     
     return schedule, morning_assigned, morning_total, evening_assigned, evening_total
 
-def display_route_schedules(routes, schedule):
-    """Display the schedule for each route with assigned employees"""
-    route_schedules = {}
+def improve_schedule(routes, employees, result, time_budget=0.5, seed=None, repeat_penalty=20.0, stats=None):
+    """Improve an assignment with local search until time_budget seconds run out.
+    
+    Each step either moves one trip to another driver of the same shift and
+    depot or swaps two trips between such drivers. A step is kept when it does not raise
+        sum(work minutes ** 2) / 100 + repeat_penalty * repeated-route trips
+    and its cost change is computed from the two drivers involved alone.
+    Departures the greedy left uncovered are offered to the least-loaded
+    conflict-free driver before and after the search, so coverage never
+    drops. The schedule and employee state are updated in place; returns the
+    same tuple as assign_employees.
+    """
+    with _phase(stats, "improve"):
+        return _improve_schedule(routes, employees, result, time_budget, seed, repeat_penalty, stats)
+
+def _improve_schedule(routes, employees, result, time_budget, seed, repeat_penalty, stats):
+    deadline = time.perf_counter() + time_budget
+    rng = random.Random(seed)
+    schedule, _, morning_total, _, evening_total = result
+    
+    # Working state: each driver's trips, work time, busy intervals and route counts
+    trips = {}
+    route_counts = {}
+    shift_employees = {}
+    for emp in employees:
+        emp_trips = list(schedule[emp.emp_id]["routes"])
+        trips[emp.emp_id] = emp_trips
+        route_counts[emp.emp_id] = {}
+        emp.clear_day()
+        for trip in emp_trips:
+            _, start_time, end_time = trip
+            emp.busy.add(start_time, end_time)
+            emp.total_work_time += end_time - start_time
+            route_counts[emp.emp_id][trip[0]] = route_counts[emp.emp_id].get(trip[0], 0) + 1
+        shift_employees.setdefault((emp.shift, emp.depot_id), []).append(emp)
+    
+    def add_trip(emp, trip):
+        route_id, start_time, end_time = trip
+        trips[emp.emp_id].append(trip)
+        emp.busy.add(start_time, end_time)
+        emp.total_work_time += end_time - start_time
+        route_counts[emp.emp_id][route_id] = route_counts[emp.emp_id].get(route_id, 0) + 1
+    
+    def remove_trip(emp, index):
+        # Swap-remove keeps this O(1); trip order is restored at the end
+        emp_trips = trips[emp.emp_id]
+        trip = emp_trips[index]
+        emp_trips[index] = emp_trips[-1]
+        emp_trips.pop()
+        route_id, start_time, end_time = trip
+        emp.busy.remove(start_time, end_time)
+        emp.total_work_time -= end_time - start_time
+        route_counts[emp.emp_id][route_id] -= 1
+        return trip
+    
+    def repeat_change(emp_id, removed_route, added_route):
+        counts = route_counts[emp_id]
+        change = 0
+        if removed_route is not None and counts.get(removed_route, 0) > 1:
+            change -= 1
+        if added_route is not None and counts.get(added_route, 0) - (added_route == removed_route) >= 1:
+            change += 1
+        return change
+    
+    def cost():
+        repeats = sum(count - 1 for counts in route_counts.values() for count in counts.values() if count > 1)
+        return sum(emp.total_work_time ** 2 for emp in employees) / 100 + repeat_penalty * repeats
+    
+    def cover_unassigned():
+        assigned = {(trip[0], trip[1]) for emp_trips in trips.values() for trip in emp_trips}
+        covered = 0
+        for route in routes:
+            for start_time in route.schedule:
+                if (route.route_id, start_time) in assigned:
+                    continue
+                end_time = start_time + route.estimated_time
+                shift = "morning" if is_morning(start_time) else "evening"
+                group = shift_employees.get((shift, route.depot_id)) or shift_employees.get((shift, None), ())
+                free = [
+                    e for e in group
+                    if not e.over_limit(end_time - start_time) and not e.busy.overlaps(start_time, end_time)
+                ]
+                if free:
+                    add_trip(min(free, key=lambda e: e.total_work_time), (route.route_id, start_time, end_time))
+                    covered += 1
+        return covered
+    
+    covered = cover_unassigned()
+    cost_before = cost()
+    
+    # Only drivers that share a shift and depot with someone else can trade trips
+    movable = [emp for group in shift_employees.values() if len(group) > 1 for emp in group]
+    iterations = moves = swaps = 0
+    while movable:
+        iterations += 1
+        if iterations % 64 == 0 and time.perf_counter() >= deadline:
+            break
+        
+        a = rng.choice(movable)
+        if not trips[a.emp_id]:
+            continue
+        group = shift_employees[(a.shift, a.depot_id)]
+        b = group[rng.randrange(len(group))]
+        if b is a:
+            continue
+        i = rng.randrange(len(trips[a.emp_id]))
+        x_route, x_start, x_end = x = trips[a.emp_id][i]
+        dx = x_end - x_start
+        wa, wb = a.total_work_time, b.total_work_time
+        
+        if not trips[b.emp_id] or rng.random() < 0.5:
+            # Move x from a to b
+            if b.over_limit(dx) or b.busy.overlaps(x_start, x_end):
+                continue
+            delta = ((wa - dx) ** 2 + (wb + dx) ** 2 - wa ** 2 - wb ** 2) / 100
+            delta += repeat_penalty * (repeat_change(a.emp_id, x_route, None) + repeat_change(b.emp_id, None, x_route))
+            if delta <= 0:
+                add_trip(b, remove_trip(a, i))
+                moves += 1
+            continue
+        
+        # Swap x with a trip y of b
+        j = rng.randrange(len(trips[b.emp_id]))
+        y_route, y_start, y_end = y = trips[b.emp_id][j]
+        if y_route == x_route:
+            continue
+        dy = y_end - y_start
+        if a.over_limit(dy - dx) or b.over_limit(dx - dy):
+            continue
+        delta = ((wa - dx + dy) ** 2 + (wb - dy + dx) ** 2 - wa ** 2 - wb ** 2) / 100
+        delta += repeat_penalty * (repeat_change(a.emp_id, x_route, y_route) + repeat_change(b.emp_id, y_route, x_route))
+        if delta > 0:
+            continue
+        
+        a.busy.remove(x_start, x_end)
+        b.busy.remove(y_start, y_end)
+        feasible = not a.busy.overlaps(y_start, y_end) and not b.busy.overlaps(x_start, x_end)
+        a.busy.add(x_start, x_end)
+        b.busy.add(y_start, y_end)
+        if feasible:
+            remove_trip(a, i)
+            remove_trip(b, j)
+            add_trip(a, y)
+            add_trip(b, x)
+            swaps += 1
+    
+    covered += cover_unassigned()
+    
+    # Write the improved assignment back
+    morning_assigned = evening_assigned = 0
+    for emp in employees:
+        emp_trips = sorted(trips[emp.emp_id], key=lambda r: r[1])
+        schedule[emp.emp_id]["routes"] = emp_trips
+        for _, start_time, _ in emp_trips:
+            if is_morning(start_time):
+                morning_assigned += 1
+            else:
+                evening_assigned += 1
+    
+    if stats is not None:
+        stats.improvement = {
+            "iterations": iterations,
+            "moves": moves,
+            "swaps": swaps,
+            "covered": covered,
+            "cost_before": cost_before,
+            "cost_after": cost(),
+        }
+    return schedule, morning_assigned, morning_total, evening_assigned, evening_total
+
+def reschedule(routes, employees, schedule, delta, start_time="06:00"):
+    """Repair an existing schedule after a change instead of rebuilding it.
+    
+    delta is a dict with any of:
+        "add_routes":       Route objects to add
+        "remove_routes":    route ids to drop
+        "reprioritize":     {route_id: new avg_priority}
+        "remove_employees": employee ids to drop (e.g. sick calls)
+    
+    routes, employees and schedule are updated in place. Trips that still
+    exist keep their driver; only new departures and the trips of removed
+    employees are assigned, each to the conflict-free driver of its shift
+    and depot with the least work time. Returns the same tuple as
+    assign_employees.
+    """
+    route_by_id = {route.route_id: route for route in routes}
+    orphans = []  # (route, departure_time) pairs that need a driver
+    
+    removed_routes = set(delta.get("remove_routes", ()))
+    routes[:] = [route for route in routes if route.route_id not in removed_routes]
+    
+    # Re-time reprioritized routes; departures that survive keep their driver
+    retimed = {}
+    for route_id, priority in delta.get("reprioritize", {}).items():
+        route = route_by_id.get(route_id)
+        if route is None or route_id in removed_routes:
+            continue
+        old_times = set(route.schedule)
+        route.avg_priority = priority
+        route.frequency = route._calculate_frequency()
+        generate_schedule([route], start_time)
+        retimed[route_id] = set(route.schedule)
+        orphans.extend((route, t) for t in route.schedule if t not in old_times)
+    
+    for route in delta.get("add_routes", ()):
+        generate_schedule([route], start_time)
+        routes.append(route)
+        route_by_id[route.route_id] = route
+        orphans.extend((route, t) for t in route.schedule)
+    
+    if removed_routes or retimed:
+        for data in schedule.values():
+            data["routes"] = [
+                r for r in data["routes"]
+                if r[0] not in removed_routes and (r[0] not in retimed or r[1] in retimed[r[0]])
+            ]
+    
+    removed_employees = set(delta.get("remove_employees", ()))
+    for emp_id in removed_employees:
+        data = schedule.pop(emp_id, None)
+        if data:
+            orphans.extend((route_by_id[route_id], start) for route_id, start, _ in data["routes"])
+    employees[:] = [emp for emp in employees if emp.emp_id not in removed_employees]
+    
+    # Rebuild driver state from the surviving assignments
+    for emp in employees:
+        data = schedule.setdefault(emp.emp_id, {"name": emp.name, "routes": []})
+        emp.clear_day()
+        for _, start, end in data["routes"]:
+            emp.busy.add(start, end)
+            emp.total_work_time += end - start
+        if data["routes"]:
+            emp.available_after = data["routes"][-1][2]
+    
+    # Drivers only take trips of their own depot, as in solve_sharded
+    groups = {}
+    for emp in employees:
+        groups.setdefault((emp.shift, emp.depot_id), []).append(emp)
+    orphan_groups = {}
+    for route, departure_time in orphans:
+        shift = "morning" if is_morning(departure_time) else "evening"
+        key = (shift, route.depot_id) if (shift, route.depot_id) in groups else (shift, None)
+        orphan_groups.setdefault(key, []).append((route, departure_time))
+    
+    for key, group_orphans in orphan_groups.items():
+        group_orphans.sort(key=lambda o: o[1])
+        pool = AvailabilityPool(groups.get(key, []))
+        touched = set()
+        for route, departure_time in group_orphans:
+            end_time = departure_time + route.estimated_time
+            emp = pool.pick_least_loaded(departure_time, end_time)
+            if emp:
+                pool.assign_relaxed(emp, departure_time, end_time)
+                schedule[emp.emp_id]["routes"].append((route.route_id, departure_time, end_time))
+                touched.add(emp.emp_id)
+        for emp_id in touched:
+            schedule[emp_id]["routes"].sort(key=lambda r: r[1])
+    
+    # Recount coverage per shift
+    morning_total = sum(1 for route in routes for t in route.schedule if is_morning(t))
+    evening_total = sum(len(route.schedule) for route in routes) - morning_total
+    morning_assigned = sum(1 for data in schedule.values() for r in data["routes"] if is_morning(r[1]))
+    evening_assigned = sum(len(data["routes"]) for data in schedule.values()) - morning_assigned
+    return schedule, morning_assigned, morning_total, evening_assigned, evening_total
+
+# Multi-depot sharding
+
+def required_by_depot(routes, exact=False):
+    """calculate_required_employees() per depot, as {depot_id: (morning, evening)}"""
+    return {
+        depot_id: calculate_required_employees(depot_routes, exact=exact)[:2]
+        for depot_id, depot_routes in _group_by_depot(routes).items()
+    }
+
+def staff_by_depot(routes, exact=False, required=None):
+    """Generate a crew for each depot, sized with calculate_required_employees.
+    
+    required may pass in the result of required_by_depot() to avoid sizing
+    twice. Employee ids are prefixed with the depot id so they stay unique
+    once the shards are merged.
+    """
+    if required is None:
+        required = required_by_depot(routes, exact=exact)
+    employees = []
+    for depot_id, (morning_emp, evening_emp) in required.items():
+        for emp in employees_for(morning_emp, evening_emp):
+            prefix = f"{depot_id}-" if depot_id is not None else ""
+            employees.append(Employee(f"{prefix}{emp.emp_id}", emp.name, emp.shift, depot_id))
+    return employees
+
+def _group_by_depot(items):
+    groups = {}
+    for item in items:
+        groups.setdefault(item.depot_id, []).append(item)
+    return groups
+
+def _solve_shard(task):
+    depot_id, routes, employees, seed, collect_stats = task
+    stats = SchedulerStats() if collect_stats else None
+    started = time.perf_counter()
+    # A spawned worker does not inherit main()'s redirect, and its progress
+    # messages must never land in the JSON Lines output
+    with contextlib.redirect_stdout(sys.stderr):
+        generate_schedule(routes, stats=stats)
+        result = assign_employees(routes, employees, seed=seed, stats=stats)
+    seconds = time.perf_counter() - started
+    # Worker processes own copies of the routes, so send the timetables back
+    return depot_id, [route.schedule for route in routes], result, seconds, stats
+
+def solve_sharded(routes, employees, seed=None, max_workers=None, stats=None):
+    """Solve each depot independently in worker processes and merge the results.
+    
+    Routes and employees are partitioned on depot_id, and a driver only
+    works routes of their own depot. Returns the same tuple as
+    assign_employees(), covering every depot. Route timetables are updated
+    in place. With stats, the per-shard counters are merged into it and
+    stats.shards gets a summary per depot. max_workers=1 runs in-process.
+    """
+    route_groups = _group_by_depot(routes)
+    employee_groups = _group_by_depot(employees)
+    depots = list(route_groups) + [d for d in employee_groups if d not in route_groups]
+    tasks = [
+        (depot_id, route_groups.get(depot_id, []), employee_groups.get(depot_id, []), seed, stats is not None)
+        for depot_id in depots
+    ]
+    
+    if max_workers == 1:
+        outcomes = [_solve_shard(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            outcomes = list(executor.map(_solve_shard, tasks))
+    
+    schedule = {}
+    morning_assigned = morning_total = evening_assigned = evening_total = 0
+    for depot_id, timetables, result, seconds, shard_stats in outcomes:
+        for route, timetable in zip(route_groups.get(depot_id, []), timetables):
+            route.schedule = timetable
+            route.last_assigned_time = timetable[-1] if timetable else None
+        
+        shard_schedule, m_assigned, m_total, e_assigned, e_total = result
+        schedule.update(shard_schedule)
+        morning_assigned += m_assigned
+        morning_total += m_total
+        evening_assigned += e_assigned
+        evening_total += e_total
+        
+        if stats is not None:
+            stats.merge(shard_stats)
+            stats.shards[depot_id] = {
+                "routes": len(route_groups.get(depot_id, [])),
+                "employees": len(employee_groups.get(depot_id, [])),
+                "morning_assigned": m_assigned,
+                "morning_total": m_total,
+                "evening_assigned": e_assigned,
+                "evening_total": e_total,
+                "seconds": seconds,
+            }
+    
+    # Employees keep their work totals from the winning attempt of their shard
+    for emp in employees:
+        emp.total_work_time = sum(end - start for _, start, end in schedule[emp.emp_id]["routes"])
+    return schedule, morning_assigned, morning_total, evening_assigned, evening_total
+
+# Multi-day horizon
+
+def horizon_crew(routes, days=DAYS_PER_WEEK, exact=False, max_weekly_minutes=MAX_WEEKLY_MINUTES):
+    """Generic crew for running the same routes on every day of a horizon.
     
-    # Initialize route_schedules dictionary
+    Each shift gets at least one day's requirement, plus relief drivers when
+    the shift's driving over a week would not fit in max_weekly_minutes each.
+    """
+    morning_emp, evening_emp, routes = calculate_required_employees(routes, exact=exact)
+    week_days = min(days, DAYS_PER_WEEK)
+    minutes = {"morning": 0, "evening": 0}
     for route in routes:
-        route_schedules[route.route_id] = {}
+        for t in route.schedule:
+            minutes["morning" if is_morning(t) else "evening"] += route.estimated_time
+    morning_emp = max(morning_emp, math.ceil(minutes["morning"] * week_days / max_weekly_minutes))
+    evening_emp = max(evening_emp, math.ceil(minutes["evening"] * week_days / max_weekly_minutes))
+    return employees_for(morning_emp, evening_emp)
+
+def iter_horizon(days, employees, start_time="06:00", seed=None, min_rest=MIN_REST_MINUTES,
+                 max_weekly_minutes=MAX_WEEKLY_MINUTES, improve_budget=0, collect_stats=False):
+    """Schedule consecutive service days, yielding (day, result, stats) as each is solved.
     
-    # Populate route schedules from employee assignments
+    days is an iterable of route lists, one per service day, and is read one
+    day at a time; use itertools.repeat(routes, n) for a fixed network.
+    Employees carry min_rest minutes of rest after their last trip into the
+    next day, and may work at most max_weekly_minutes per DAYS_PER_WEEK days.
+    Only the current day's departures and assignments are held, so memory
+    does not grow with the horizon. result is the assign_employees tuple and
+    stats a fresh SchedulerStats per day when collect_stats is set. The
+    carry-over state is cleared from the employees when the generator
+    finishes or is closed.
+    """
+    day_length = SERVICE_END - SERVICE_START
+    for emp in employees:
+        emp.rest_until = None
+    
+    try:
+        for day, routes in enumerate(days):
+            if day % DAYS_PER_WEEK == 0:
+                for emp in employees:
+                    emp.week_work_time = 0
+            for emp in employees:
+                remaining = max(0, max_weekly_minutes - emp.week_work_time)
+                # An allowance longer than the service day cannot bind
+                emp.work_limit = remaining if remaining < day_length else None
+            
+            stats = SchedulerStats() if collect_stats else None
+            routes = generate_schedule(routes, start_time, stats=stats)
+            # Equal candidates go to whoever has worked least this week
+            rostered = sorted(employees, key=lambda emp: emp.week_work_time)
+            result = assign_employees(
+                routes, rostered, seed=None if seed is None else seed + day, stats=stats, improve_budget=improve_budget
+            )
+            
+            schedule = result[0]
+            for emp in employees:
+                trips = schedule[emp.emp_id]["routes"]
+                if trips:
+                    emp.week_work_time += sum(end - start for _, start, end in trips)
+                    emp.rest_until = trips[-1][2] + min_rest - MINUTES_PER_DAY
+                else:
+                    emp.rest_until = None
+            yield day, result, stats
+    finally:
+        # The carry-over is only meaningful inside the horizon; leave the roster
+        # ready for ordinary single-day scheduling
+        for emp in employees:
+            emp.rest_until = None
+            emp.work_limit = None
+            emp.week_work_time = 0
+
+def _route_drivers(schedule):
+    """Map (route_id, start) to (emp_id, employee_name) in one pass over the assignments"""
+    drivers = {}
     for emp_id, data in schedule.items():
-        employee_name = data["name"]
-        for route_id, start_time, end_time in data["routes"]:
-            if start_time not in route_schedules[route_id]:
-                route_schedules[route_id][start_time] = []
-            route_schedules[route_id][start_time].append((end_time, employee_name, emp_id))
+        for route_id, start_time, _ in data["routes"]:
+            # There should only be one employee per route per departure time
+            drivers.setdefault((route_id, start_time), (emp_id, data["name"]))
+    return drivers
+
+def iter_route_rows(routes, schedule):
+    """Yield (route, start, end, emp_id, employee_name) for every departure of
+    every route, in timetable order; emp_id and name are None when uncovered"""
+    drivers = _route_drivers(schedule)
+    for route in routes:
+        for start_time in route.schedule:
+            emp_id, employee_name = drivers.get((route.route_id, start_time), (None, None))
+            yield route, start_time, start_time + route.estimated_time, emp_id, employee_name
+
+def display_route_schedules(routes, schedule):
+    """Display the schedule for each route with assigned employees"""
+    drivers = _route_drivers(schedule)
     
     # Display each route's schedule
     print("\n===== ROUTE SCHEDULES =====")
@@ -366,18 +1458,17 @@ def display_route_schedules(routes, schedule):
         print(f"{'Start Time':<10} {'End Time':<10} {'Employee':<15} {'ID':<6}")
         print("-" * 45)
         
-        # Get sorted list of departure times
-        departure_times = sorted(route_schedules[route_id].keys(), key=lambda x: datetime.strptime(x, "%H:%M"))
-        
-        for start_time in departure_times:
-            # There should only be one employee per route per departure time
-            if route_schedules[route_id][start_time]:
-                end_time, employee_name, emp_id = route_schedules[route_id][start_time][0]
-                print(f"{start_time:<10} {end_time:<10} {employee_name:<15} {emp_id:<6}")
+        covered_departures = 0
+        for start_time in route.schedule:
+            driver = drivers.get((route_id, start_time))
+            if driver:
+                emp_id, employee_name = driver
+                end_time = start_time + route.estimated_time
+                print(f"{format_time(start_time):<10} {format_time(end_time):<10} {employee_name:<15} {emp_id:<6}")
+                covered_departures += 1
         
         # Count total scheduled departures
         total_scheduled_departures = len(route.schedule)
-        covered_departures = len(route_schedules[route_id])
         
         print(f"\nScheduled departures: {total_scheduled_departures}")
         print(f"Covered departures: {covered_departures}")
@@ -386,46 +1477,107 @@ def display_route_schedules(routes, schedule):
         departure_coverage = (covered_departures / total_scheduled_departures) * 100 if total_scheduled_departures > 0 else 0
         print(f"Departure coverage: {departure_coverage:.1f}% ({covered_departures}/{total_scheduled_departures} departures)")
 
-# Example Routes and Employees with varying priorities
-routes = [
-    Route("R1", 40, 12, 10),   # Highest priority route (10/10) - every 10 minutes
-    Route("R2", 40, 18, 5),    # Medium priority route (5/10) - every 25 minutes
-    Route("R3", 30, 8, 1)      # Lowest priority route (1/10) - every 40 minutes
-]
+# Exporters
+# Every exporter streams rows straight to an open file in a single pass.
 
-# Print frequency for each route
-print("Route Frequencies:")
-for route in routes:
-    print(f"Route {route.route_id} (Priority {route.avg_priority}): Every {route.frequency} minutes")
+ASSIGNMENT_COLUMNS = ("emp_id", "employee_name", "shift", "route_id", "schedule", "end_time", "duration")
+ROUTE_COLUMNS = ("route_id", "schedule", "end_time", "duration", "emp_id", "employee_name")
+
+def iter_assignment_rows(schedule, employees):
+    """Yield one row per assigned trip, grouped by employee, matching ASSIGNMENT_COLUMNS.
+    
+    The "schedule" column holds the departure time, as in the dashboard's
+    schedule table.
+    """
+    shifts = {emp.emp_id: emp.shift for emp in employees}
+    for emp_id, data in schedule.items():
+        shift = shifts.get(emp_id)
+        for route_id, start_time, end_time in data["routes"]:
+            yield (emp_id, data["name"], shift, route_id, format_time(start_time), format_time(end_time),
+                   end_time - start_time)
 
-# Calculate required employees and generate schedule
-morning_emp, evening_emp, routes_with_schedule = calculate_required_employees(routes)
+def iter_route_export_rows(routes, schedule):
+    """Yield one row per departure, grouped by route, matching ROUTE_COLUMNS"""
+    for route, start_time, end_time, emp_id, employee_name in iter_route_rows(routes, schedule):
+        yield (route.route_id, format_time(start_time), format_time(end_time), route.estimated_time,
+               emp_id, employee_name)
 
+def export_jsonl(f, rows, columns=ASSIGNMENT_COLUMNS):
+    """Write rows as JSON Lines objects keyed by column name"""
+    encode = json.JSONEncoder().encode
+    for row in rows:
+        f.write(encode(dict(zip(columns, row))))
+        f.write("\n")
 
-print(f"Adjusted required employees: Morning: {morning_emp}, Evening: {evening_emp}")
+def export_csv(f, rows, columns=ASSIGNMENT_COLUMNS):
+    """Write rows as CSV with a header line"""
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    writer.writerows(rows)
 
-employees = [Employee(f"E{i+1}", f"Employee {i+1}", "morning" if i < morning_emp else "evening") for i in range(morning_emp + evening_emp)]
-schedule, morning_assigned, morning_total, evening_assigned, evening_total = assign_employees(routes_with_schedule, employees)
+# Binary layout (little-endian):
+#   header     "BSCH", version u16, employee count u32, route count u32
+#   employees  emp_id, name, shift as u16-length-prefixed UTF-8
+#   routes     route_id as u16-length-prefixed UTF-8
+#   records    (employee index u32, route index u32, start u16, end u16) until EOF
+# Times are service-day minutes.
+BINARY_MAGIC = b"BSCH"
+BINARY_VERSION = 1
+_BINARY_HEADER = struct.Struct("<4sHII")
+_BINARY_RECORD = struct.Struct("<IIHH")
 
-# Display route schedules
-display_route_schedules(routes_with_schedule, schedule)
+def _write_binary_string(f, value):
+    data = str(value).encode("utf-8")
+    f.write(struct.pack("<H", len(data)))
+    f.write(data)
 
-# Output statistics
-print("\n===== ASSIGNMENT STATISTICS =====")
-print(f"Total Morning Routes: {morning_total}, Assigned: {morning_assigned}")
-print(f"Total Evening Routes: {evening_total}, Assigned: {evening_assigned}")
-print(f"Total Required Employees: Morning: {morning_emp}, Evening: {evening_emp}")
+def _read_binary_string(f):
+    (length,) = struct.unpack("<H", f.read(2))
+    return f.read(length).decode("utf-8")
 
-# Check if all routes are assigned
-all_assigned = (morning_assigned == morning_total) and (evening_assigned == evening_total)
-print(f"\nAll routes assigned: {'Yes' if all_assigned else 'No'}")
-if not all_assigned:
-    print("Routes not fully assigned. Consider adding more employees or adjusting scheduling parameters.")
+def export_binary(f, routes, employees, schedule):
+    """Write the assignments in the compact binary layout to a binary file"""
+    f.write(_BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(employees), len(routes)))
+    for emp in employees:
+        _write_binary_string(f, emp.emp_id)
+        _write_binary_string(f, emp.name)
+        _write_binary_string(f, emp.shift)
+    route_positions = {}
+    for i, route in enumerate(routes):
+        route_positions[route.route_id] = i
+        _write_binary_string(f, route.route_id)
+    
+    pack = _BINARY_RECORD.pack
+    for i, emp in enumerate(employees):
+        data = schedule.get(emp.emp_id)
+        if data:
+            f.write(b"".join(
+                pack(i, route_positions[route_id], start_time, end_time)
+                for route_id, start_time, end_time in data["routes"]
+            ))
 
-# Save detailed output to a file
-output_file = "schedule_output.txt"
+def read_binary(f):
+    """Read a file written by export_binary.
+    
+    Returns (employees, route_ids, records), where employees is a list of
+    (emp_id, name, shift) and records are (emp_id, route_id, start, end).
+    """
+    magic, version, n_employees, n_routes = _BINARY_HEADER.unpack(f.read(_BINARY_HEADER.size))
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError("not a schedule binary file")
+    employees = [tuple(_read_binary_string(f) for _ in range(3)) for _ in range(n_employees)]
+    route_ids = [_read_binary_string(f) for _ in range(n_routes)]
+    
+    records = []
+    data = f.read()
+    for emp_index, route_index, start_time, end_time in _BINARY_RECORD.iter_unpack(data):
+        records.append((employees[emp_index][0], route_ids[route_index], start_time, end_time))
+    return employees, route_ids, records
 
-with open(output_file, "w") as f:
+def write_text_report(f, routes, employees, result):
+    """Write the human-readable report that run_example saves"""
+    schedule, morning_assigned, morning_total, evening_assigned, evening_total = result
+    
     # Write route information
     f.write("Route Information:\n")
     for route in routes:
@@ -438,27 +1590,311 @@ with open(output_file, "w") as f:
     f.write(f"Total Evening Routes: {evening_total}, Assigned: {evening_assigned}\n\n")
     
     # Write employee schedules
+    shifts = {emp.emp_id: emp.shift for emp in employees}
     for emp_id, data in schedule.items():
-        f.write(f"\nEmployee: {data['name']} ({emp_id}) - {next(e.shift for e in employees if e.emp_id == emp_id)} shift\n")
+        lines = [f"\nEmployee: {data['name']} ({emp_id}) - {shifts.get(emp_id)} shift\n"]
         
         # Count route distribution
         route_counts = {}
-        for r in data['routes']:
-            if r[0] not in route_counts:
-                route_counts[r[0]] = 0
-            route_counts[r[0]] += 1
-        
-        # Print route distribution
-        f.write("  Route distribution: ")
-        for r_id, count in route_counts.items():
-            f.write(f"{r_id}({count}) ")
-        f.write("\n")
+        total_minutes = 0
+        for route_id, start_time, end_time in data["routes"]:
+            route_counts[route_id] = route_counts.get(route_id, 0) + 1
+            total_minutes += end_time - start_time
+        lines.append("  Route distribution: " + "".join(f"{r_id}({count}) " for r_id, count in route_counts.items()) + "\n")
         
-        # Print detailed schedule
-        for r in data['routes']:
-            f.write(f"  Route {r[0]}: {r[1]} - {r[2]}\n")
+        # Detailed schedule
+        lines.extend(
+            f"  Route {route_id}: {format_time(start_time)} - {format_time(end_time)}\n"
+            for route_id, start_time, end_time in data["routes"]
+        )
+        lines.append(f"  Total work time: {total_minutes // 60} hours {total_minutes % 60} minutes\n")
+        f.write("".join(lines))
+
+EXPORT_FORMATS = ("txt", "jsonl", "csv", "bin")
+
+def export_format(path):
+    """Export format named by a file's extension; ValueError if it is not supported"""
+    fmt = os.path.splitext(path)[1].lstrip(".")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}; expected one of {', '.join(EXPORT_FORMATS)}")
+    return fmt
+
+def export_schedule(path, routes, employees, result, fmt=None, by="employee"):
+    """Write a schedule to path as txt, jsonl, csv or bin.
+    
+    The format defaults to the file extension. by="route" exports one row per
+    departure (uncovered ones included) instead of one per assigned trip;
+    the text and binary formats are always per employee.
+    """
+    fmt = fmt or export_format(path)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}; expected one of {', '.join(EXPORT_FORMATS)}")
+    schedule = result[0]
+    
+    if fmt == "bin":
+        with open(path, "wb") as f:
+            export_binary(f, routes, employees, schedule)
+        return
+    
+    with open(path, "w", newline="" if fmt == "csv" else None) as f:
+        if fmt == "txt":
+            write_text_report(f, routes, employees, result)
+            return
+        if by == "route":
+            rows, columns = iter_route_export_rows(routes, schedule), ROUTE_COLUMNS
+        else:
+            rows, columns = iter_assignment_rows(schedule, employees), ASSIGNMENT_COLUMNS
+        if fmt == "jsonl":
+            export_jsonl(f, rows, columns)
+        else:
+            export_csv(f, rows, columns)
+
+def run_example(output_file="schedule_output.txt", stats=None, export_file=None, improve_budget=0, seed=None,
+                exact=False):
+    """Schedule the sample three-route network, print it and write a report"""
+    # Example Routes and Employees with varying priorities
+    routes = [
+        Route("R1", 40, 12, 10),   # Highest priority route (10/10) - every 10 minutes
+        Route("R2", 40, 18, 5),    # Medium priority route (5/10) - every 25 minutes
+        Route("R3", 30, 8, 1)      # Lowest priority route (1/10) - every 40 minutes
+    ]
+
+    # Print frequency for each route
+    print("Route Frequencies:")
+    for route in routes:
+        print(f"Route {route.route_id} (Priority {route.avg_priority}): Every {route.frequency} minutes")
+
+    # Calculate required employees and generate schedule
+    morning_emp, evening_emp, routes_with_schedule = calculate_required_employees(routes, exact=exact, stats=stats)
+
+    print(f"Adjusted required employees: Morning: {morning_emp}, Evening: {evening_emp}")
+    bounds = required_employee_bounds(routes_with_schedule)
+    print(f"Minimum drivers without overlap: Morning: {bounds['morning'][1]}, Evening: {bounds['evening'][1]}")
+
+    employees = employees_for(morning_emp, evening_emp)
+    schedule, morning_assigned, morning_total, evening_assigned, evening_total = assign_employees(
+        routes_with_schedule, employees, seed=seed, stats=stats, improve_budget=improve_budget
+    )
+
+    # Display route schedules
+    display_route_schedules(routes_with_schedule, schedule)
+
+    # Output statistics
+    print("\n===== ASSIGNMENT STATISTICS =====")
+    print(f"Total Morning Routes: {morning_total}, Assigned: {morning_assigned}")
+    print(f"Total Evening Routes: {evening_total}, Assigned: {evening_assigned}")
+    print(f"Total Required Employees: Morning: {morning_emp}, Evening: {evening_emp}")
+
+    # Check if all routes are assigned
+    all_assigned = (morning_assigned == morning_total) and (evening_assigned == evening_total)
+    print(f"\nAll routes assigned: {'Yes' if all_assigned else 'No'}")
+    if not all_assigned:
+        print("Routes not fully assigned. Consider adding more employees or adjusting scheduling parameters.")
+
+    # Save detailed output to a file
+    result = (schedule, morning_assigned, morning_total, evening_assigned, evening_total)
+    export_schedule(output_file, routes, employees, result, fmt="txt")
+    if export_file:
+        export_schedule(export_file, routes, employees, result)
+        print(f"Schedule exported to {export_file}")
+
+    print(f"\nDetailed output saved to {output_file}")
+
+def employees_for(morning_employees, evening_employees):
+    """Generic crew for a depot that did not list its own employees"""
+    total = morning_employees + evening_employees
+    return [Employee(f"E{i+1}", f"Employee {i+1}", "morning" if i < morning_employees else "evening") for i in range(total)]
+
+def load_depot(record):
+    """Build routes and employees from one batch record.
+    
+    Routes need route_id, estimated_time and avg_priority (length is
+    optional). Employees need emp_id and shift (name defaults to the id).
+    Both may carry a depot_id for sharded solving.
+    """
+    routes = [
+        Route(r["route_id"], r["estimated_time"], r.get("length", 0), r["avg_priority"], r.get("depot_id"))
+        for r in record["routes"]
+    ]
+    employees = None
+    if record.get("employees") is not None:
+        employees = [
+            Employee(e["emp_id"], e.get("name", e["emp_id"]), e["shift"], e.get("depot_id"))
+            for e in record["employees"]
+        ]
+    return routes, employees
+
+def solve_depot(record, exact=False, seed=None, stats=None, sharded=False, max_workers=None, improve_budget=0):
+    """Schedule one depot record and return a JSON-ready result dict.
+    
+    When the record has no employees, a crew is sized with
+    calculate_required_employees() and generated. With sharded=True the
+    record may span several depots (by depot_id), which are solved in
+    parallel with solve_sharded(). A positive improve_budget spends that
+    many seconds in improve_schedule() after the greedy pass. With stats, the collected SchedulerStats
+    are included under "stats".
+    """
+    routes, employees = load_depot(record)
+    if sharded:
+        # Report the computed requirement, as the unsharded path does, even for a listed crew
+        required = required_by_depot(routes, exact=exact)
+        morning_emp = sum(morning for morning, _ in required.values())
+        evening_emp = sum(evening for _, evening in required.values())
+        if employees is None:
+            employees = staff_by_depot(routes, exact=exact, required=required)
+        schedule, morning_assigned, morning_total, evening_assigned, evening_total = solve_sharded(
+            routes, employees, seed=seed, max_workers=max_workers, stats=stats
+        )
+        if improve_budget > 0:
+            schedule, morning_assigned, morning_total, evening_assigned, evening_total = improve_schedule(
+                routes, employees, (schedule, morning_assigned, morning_total, evening_assigned, evening_total),
+                time_budget=improve_budget, seed=seed, stats=stats
+            )
+    else:
+        morning_emp, evening_emp, routes = calculate_required_employees(routes, exact=exact, stats=stats)
+        if employees is None:
+            employees = employees_for(morning_emp, evening_emp)
         
-        total_minutes = sum((datetime.strptime(r[2], "%H:%M") - datetime.strptime(r[1], "%H:%M")).seconds // 60 for r in data['routes'])
-        f.write(f"  Total work time: {total_minutes // 60} hours {total_minutes % 60} minutes\n")
+        schedule, morning_assigned, morning_total, evening_assigned, evening_total = assign_employees(
+            routes, employees, seed=seed, stats=stats, improve_budget=improve_budget
+        )
+    result = {
+        "depot": record.get("depot"),
+        "required_employees": {"morning": morning_emp, "evening": evening_emp},
+        "morning": {"assigned": morning_assigned, "total": morning_total},
+        "evening": {"assigned": evening_assigned, "total": evening_total},
+        "schedule": _schedule_record(employees, schedule),
+    }
+    if stats is not None:
+        result["stats"] = stats.to_dict()
+    return result
+
+def _schedule_record(employees, schedule):
+    return {
+        emp.emp_id: {
+            "name": emp.name,
+            "shift": emp.shift,
+            "routes": [
+                [route_id, format_time(start), format_time(end)]
+                for route_id, start, end in schedule[emp.emp_id]["routes"]
+            ],
+        }
+        for emp in employees
+    }
+
+def iter_depot_horizon(record, days, exact=False, seed=None, collect_stats=False, improve_budget=0):
+    """Schedule one depot record over consecutive days, yielding a JSON-ready result per day.
+    
+    When the record has no employees, a crew is sized with horizon_crew().
+    Each day's schedule also reports every employee's minutes so far that week.
+    """
+    routes, employees = load_depot(record)
+    if employees is None:
+        employees = horizon_crew(routes, days, exact=exact)
+    horizon = iter_horizon(itertools.repeat(routes, days), employees, seed=seed,
+                           improve_budget=improve_budget, collect_stats=collect_stats)
+    for day, (schedule, morning_assigned, morning_total, evening_assigned, evening_total), stats in horizon:
+        result = {
+            "depot": record.get("depot"),
+            "day": day,
+            "morning": {"assigned": morning_assigned, "total": morning_total},
+            "evening": {"assigned": evening_assigned, "total": evening_total},
+            "schedule": _schedule_record(employees, schedule),
+        }
+        for emp in employees:
+            result["schedule"][emp.emp_id]["week_minutes"] = emp.week_work_time
+        if stats is not None:
+            result["stats"] = stats.to_dict()
+        yield result
+
+def iter_batch(lines, exact=False, seed=None, collect_stats=False, sharded=False, max_workers=None,
+               improve_budget=0, days=None):
+    """Solve a stream of JSON Lines depot records, yielding one result per record,
+    or with days set, one result per record and day.
+    
+    A record that cannot be read or scheduled yields {"depot", "line",
+    "error"} instead, and the batch carries on with the next record.
+    """
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        record = None
+        try:
+            record = json.loads(line)
+            if days is not None:
+                yield from iter_depot_horizon(record, days, exact=exact, seed=seed,
+                                              collect_stats=collect_stats, improve_budget=improve_budget)
+                continue
+            stats = SchedulerStats() if collect_stats else None
+            yield solve_depot(record, exact=exact, seed=seed, stats=stats,
+                              sharded=sharded, max_workers=max_workers, improve_budget=improve_budget)
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            yield {
+                "depot": record.get("depot") if isinstance(record, dict) else None,
+                "line": line_number,
+                "error": f"invalid depot record: {e!r}",
+            }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate bus departures and crew assignments.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="JSON Lines file of depots to schedule ('-' for stdin); "
+                             "without it the sample network is scheduled")
+    parser.add_argument("--output", metavar="FILE", default="-",
+                        help="where to write batch results as JSON Lines (default: stdout)")
+    parser.add_argument("--exact", action="store_true",
+                        help="staff each shift at its exact minimum crew size")
+    parser.add_argument("--seed", type=int, help="seed for reproducible tie-breaking")
+    parser.add_argument("--stats", action="store_true",
+                        help="include per-phase timings and counters; for the sample run they go to stderr as JSON")
+    parser.add_argument("--sharded", action="store_true",
+                        help="split each batch record by depot_id and solve the depots in parallel")
+    parser.add_argument("--workers", type=int, help="worker processes for --sharded (default: one per core)")
+    parser.add_argument("--export", metavar="FILE",
+                        help="also export the sample schedule; the format (.jsonl, .csv, .bin, .txt) "
+                             "comes from the extension")
+    parser.add_argument("--improve", metavar="SECONDS", type=float, default=0,
+                        help="time budget for local search after the greedy assignment (default: off)")
+    parser.add_argument("--days", type=int,
+                        help="schedule each batch record over this many consecutive days, one result per day, "
+                             "carrying rest time and weekly hours across days")
+    args = parser.parse_args(argv)
+    if args.days is not None and (args.batch is None or args.sharded):
+        parser.error("--days needs --batch and cannot be combined with --sharded")
+    if args.batch is None and (args.sharded or args.workers is not None):
+        parser.error("--sharded and --workers need --batch")
+    if args.export is not None:
+        if args.batch is not None:
+            parser.error("--export applies to the sample run; batch results are already JSON Lines")
+        try:
+            export_format(args.export)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    if args.batch is None:
+        stats = SchedulerStats() if args.stats else None
+        run_example(stats=stats, export_file=args.export, improve_budget=args.improve, seed=args.seed,
+                    exact=args.exact)
+        if stats is not None:
+            print(stats.to_json(), file=sys.stderr)
+        return 0
+    
+    source = sys.stdin if args.batch == "-" else open(args.batch)
+    sink = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        # Progress messages go to stderr so they never mix with the results
+        with contextlib.redirect_stdout(sys.stderr):
+            for result in iter_batch(source, exact=args.exact, seed=args.seed, collect_stats=args.stats,
+                                     sharded=args.sharded, max_workers=args.workers,
+                                     improve_budget=args.improve, days=args.days):
+                sink.write(json.dumps(result) + "\n")
+                sink.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    return 0
 
-print(f"\nDetailed output saved to {output_file}")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import app
+from app import Route, assign_employees, employees_for, generate_schedule, required_employee_bounds
+
+DEFAULT_SIZES = (10, 50, 200, 500)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+PHASES = ("generate", "staffing", "assign")
+# Timed alongside PHASES but left out of the total
+EXTRA_TIMINGS = ("cached",)
+
+# Timings below this many seconds are too noisy to call a regression
+NOISE_FLOOR = 0.005
+
+def synthetic_city(n_routes, seed=0):
+    """Seeded synthetic network: a list of routes and the peak windows to run it with"""
+    rng = random.Random(seed)
+    routes = []
+    for i in range(n_routes):
+        # A few long, busy trunk routes, many mid-priority feeders and some quiet ones
+        kind = rng.random()
+        if kind < 0.15:
+            priority = rng.randint(8, 10)
+            estimated_time = rng.randint(45, 120)
+        elif kind < 0.75:
+            priority = rng.randint(4, 7)
+            estimated_time = rng.randint(30, 75)
+        else:
+            priority = rng.randint(1, 3)
+            estimated_time = rng.randint(20, 45)
+        length = round(estimated_time * rng.uniform(0.25, 0.45), 1)
+        routes.append(Route(f"R{i+1}", estimated_time, length, priority))
+
+    # Morning and evening rush, and sometimes a midday school peak
+    peak_hours = [(rng.choice((7, 8)), rng.choice((9, 10)), 30), (rng.choice((16, 17)), rng.choice((19, 20)), 30)]
+    if rng.random() < 0.5:
+        peak_hours.insert(1, (12, 13, 30))
+    return routes, peak_hours
+
+def _run_pipeline(routes, seed):
+    """Run every phase once, returning per-phase seconds and the assignment result"""
+    timings = {}
+
+    # Bypass the timetable cache, or every run after the first would time a lookup
+    started = time.perf_counter()
+    generate_schedule(routes, use_cache=False)
+    timings["generate"] = time.perf_counter() - started
+
+    # Generation again with a warm cache, for the cached column
+    generate_schedule(routes)
+    started = time.perf_counter()
+    generate_schedule(routes)
+    timings["cached"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    bounds = required_employee_bounds(routes)
+    timings["staffing"] = time.perf_counter() - started
+
+    employees = employees_for(bounds["morning"][0], bounds["evening"][0])
+    started = time.perf_counter()
+    result = assign_employees(routes, employees, seed=seed)
+    timings["assign"] = time.perf_counter() - started
+    return timings, result, len(employees)
+
+def run_scenario(n_routes, seed=0, repeat=1, measure_memory=True):
+    """Benchmark one synthetic network size and return its metrics"""
+    routes, peak_hours = synthetic_city(n_routes, seed)
+    saved_peak_hours = app.PEAK_HOURS
+    app.PEAK_HOURS = peak_hours
+    try:
+        # The scheduler reports progress with print; keep it out of the table
+        with contextlib.redirect_stdout(io.StringIO()):
+            best = None
+            for _ in range(repeat):
+                timings, result, n_employees = _run_pipeline(routes, seed)
+                best = timings if best is None else {p: min(best[p], timings[p]) for p in timings}
+
+            peak_memory_kb = None
+            if measure_memory:
+                tracemalloc.start()
+                try:
+                    _run_pipeline(routes, seed)
+                    peak_memory_kb = tracemalloc.get_traced_memory()[1] // 1024
+                finally:
+                    tracemalloc.stop()
+    finally:
+        app.PEAK_HOURS = saved_peak_hours
+
+    _, morning_assigned, morning_total, evening_assigned, evening_total = result
+    total = morning_total + evening_total
+    return {
+        "routes": n_routes,
+        "departures": total,
+        "employees": n_employees,
+        **best,
+        "total": sum(best[p] for p in PHASES),
+        "peak_memory_kb": peak_memory_kb,
+        "coverage": (morning_assigned + evening_assigned) / total if total else 1.0,
+    }
+
+def find_regressions(results, baseline, tolerance=0.25):
+    """Compare results against a stored baseline and describe anything that got worse"""
+    regressions = []
+    for metrics in results:
+        base = baseline.get(str(metrics["routes"]))
+        if not base:
+            continue
+        label = f"{metrics['routes']} routes"
+        for phase in PHASES + EXTRA_TIMINGS + ("total",):
+            if phase in base and metrics[phase] > max(base[phase] * (1 + tolerance), base[phase] + NOISE_FLOOR):
+                regressions.append(f"{label}: {phase} {metrics[phase]:.3f}s vs baseline {base[phase]:.3f}s")
+        if metrics["peak_memory_kb"] and base.get("peak_memory_kb"):
+            if metrics["peak_memory_kb"] > base["peak_memory_kb"] * (1 + tolerance):
+                regressions.append(f"{label}: peak memory {metrics['peak_memory_kb']} KiB "
+                                   f"vs baseline {base['peak_memory_kb']} KiB")
+        if metrics["coverage"] < base.get("coverage", 0):
+            regressions.append(f"{label}: coverage {metrics['coverage']:.2%} vs baseline {base['coverage']:.2%}")
+    return regressions
+
+def print_table(results):
+    print(f"{'Routes':>6} {'Deps':>7} {'Emps':>6} {'Generate':>9} {'Cached':>9} {'Staffing':>9} {'Assign':>9} "
+          f"{'Total':>9} {'Peak KiB':>9} {'Coverage':>9}")
+    print("-" * 93)
+    for m in results:
+        memory = m["peak_memory_kb"] if m["peak_memory_kb"] is not None else "-"
+        print(f"{m['routes']:>6} {m['departures']:>7} {m['employees']:>6} {m['generate']:>9.3f} {m['cached']:>9.3f} "
+              f"{m['staffing']:>9.3f} {m['assign']:>9.3f} {m['total']:>9.3f} {memory:>9} {m['coverage']:>9.2%}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the crew scheduler on synthetic networks.",
+        epilog="Timings only compare on the machine that recorded them, so no baseline is committed. "
+               "Record one with `python bench.py --save-baseline` on a clean checkout, then rerun "
+               "without it after a change. Larger networks (e.g. --sizes 1000 2000) take minutes; "
+               "add --no-memory to skip the second, tracemalloc run.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="numbers of routes to benchmark (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic networks and the solver")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size; the fastest is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory run")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown or memory growth before flagging a regression")
+    args = parser.parse_args(argv)
+
+    results = []
+    for n_routes in args.sizes:
+        results.append(run_scenario(n_routes, args.seed, args.repeat, not args.no_memory))
+    print_table(results)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({str(m["routes"]): m for m in results}, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline on a clean checkout to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        regressions = find_regressions(results, json.load(f), args.tolerance)
+    if regressions:
+        print("\nREGRESSIONS:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions against baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from app import solve_depot
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+def request_key(request):
+    """Identical requests (same depot data and options) share one key"""
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _solve_request(payload):
+    """Executor entry point: solve one request and return the response body as JSON text.
+
+    The payload is a batch record (see app.load_depot) with an optional
+    "options" object holding exact, seed and sharded.
+    """
+    request = json.loads(payload)
+    options = request.pop("options", None) or {}
+    try:
+        # The scheduler reports progress with print; keep stdout for the server
+        with contextlib.redirect_stdout(sys.stderr):
+            result = solve_depot(
+                request,
+                exact=bool(options.get("exact", False)),
+                seed=options.get("seed"),
+                sharded=bool(options.get("sharded", False)),
+                # This already runs in a pool worker, so shards run in-process
+                max_workers=1,
+            )
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"invalid schedule request: {e!r}") from None
+    return json.dumps(result)
+
+class ScheduleService:
+    """Long-running scheduler front end.
+
+    Solves run in an executor. Identical requests that arrive while one is
+    being solved wait for that solve instead of starting another, and recent
+    results are kept in an LRU cache for cache_ttl seconds.
+    """
+    def __init__(self, executor=None, cache_size=128, cache_ttl=300.0):
+        self.executor = executor or ProcessPoolExecutor()
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.solves = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self._results = OrderedDict()  # key -> (expires_at, response body)
+        self._inflight = {}  # key -> future of the running solve
+
+    async def schedule(self, request):
+        """Return the JSON response body for a schedule request"""
+        key = request_key(request)
+        cached = self._results.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self._results.move_to_end(key)
+                self.cache_hits += 1
+                return cached[1]
+            del self._results[key]
+
+        future = self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, _solve_request, json.dumps(request))
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._finish(key, f))
+            self.solves += 1
+        else:
+            self.coalesced += 1
+        # A client hanging up must not cancel the solve other clients wait on
+        return await asyncio.shield(future)
+
+    def _finish(self, key, future):
+        self._inflight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._results[key] = (time.monotonic() + self.cache_ttl, future.result())
+        self._results.move_to_end(key)
+        while len(self._results) > self.cache_size:
+            self._results.popitem(last=False)
+
+    def health(self):
+        return {
+            "status": "ok",
+            "solves": self.solves,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "cached": len(self._results),
+            "inflight": len(self._inflight),
+        }
+
+    async def _dispatch(self, reader):
+        """Read one HTTP request and return (status, JSON body text)"""
+        request_line = await reader.readline()
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3:
+            return 400, json.dumps({"error": "malformed request line"})
+        method, path, _ = parts
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            return 400, json.dumps({"error": "invalid Content-Length"})
+        if length > MAX_BODY_BYTES:
+            return 413, json.dumps({"error": "request body too large"})
+        body = await reader.readexactly(length) if length else b""
+
+        path = path.split("?", 1)[0]
+        if path == "/health":
+            if method != "GET":
+                return 405, json.dumps({"error": "use GET"})
+            return 200, json.dumps(self.health())
+        if path != "/schedule":
+            return 404, json.dumps({"error": f"unknown path {path}"})
+        if method != "POST":
+            return 405, json.dumps({"error": "use POST"})
+
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return 400, json.dumps({"error": "body is not valid JSON"})
+        if not isinstance(request, dict) or not isinstance(request.get("routes"), list):
+            return 400, json.dumps({"error": "expected a JSON object with a routes list"})
+        options = request.get("options")
+        if options is not None and not isinstance(options, dict):
+            return 400, json.dumps({"error": "options must be a JSON object"})
+        try:
+            return 200, await self.schedule(request)
+        except ValueError as e:
+            return 400, json.dumps({"error": str(e)})
+
+    async def handle(self, reader, writer):
+        try:
+            status, body = await self._dispatch(reader)
+        except asyncio.IncompleteReadError:
+            status, body = 400, json.dumps({"error": "incomplete request body"})
+        except Exception as e:
+            status, body = 500, json.dumps({"error": repr(e)})
+
+        data = body.encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + data
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+async def serve(host="127.0.0.1", port=8765, workers=None, cache_size=128, cache_ttl=300.0):
+    service = ScheduleService(ProcessPoolExecutor(max_workers=workers), cache_size, cache_ttl)
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Scheduling service listening on http://{host}:{port}", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.executor.shutdown(cancel_futures=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve crew schedules over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, help="solver processes (default: one per core)")
+    parser.add_argument("--cache-size", type=int, default=128, help="recent results to keep")
+    parser.add_argument("--cache-ttl", type=float, default=300.0, help="seconds a cached result stays valid")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.cache_size, args.cache_ttl))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+import io
+import itertools
+import random
+
+import pytest
+
+import app
+from app import IntervalIndex, Route, generate_schedule, iter_departures, parse_time
+
+START_TIMES = ("06:00", "07:55", "17:03", "00:30")
+PEAK_VARIANTS = (app.PEAK_HOURS, [(6, 7, 20), (12, 13, 30), (23, 25, 16)])
+
+def sample_routes():
+    # Every priority, plus out-of-range and fractional ones
+    priorities = list(range(1, 11)) + [0, 12, 2.5, 7.7]
+    return [Route(f"R{i}", 30 + i, 10, priority) for i, priority in enumerate(priorities)]
+
+def reference_departures(frequency, start, snap_to_slots):
+    """Departures of one route found by scanning every slot, as the original
+    generator did (one-minute slots when not snapping)"""
+    departures = []
+    next_due = start
+    current_time = start
+    while current_time < app.SERVICE_END:
+        interval = 10 if snap_to_slots else 1
+        in_peak = False
+        for peak_start, peak_end, peak_min in app.PEAK_HOURS:
+            if peak_start <= app.clock_hour(current_time) < peak_end:
+                if snap_to_slots:
+                    interval = peak_min // 2
+                in_peak = True
+        if current_time >= next_due:
+            departures.append(current_time)
+            next_due = current_time + max(10, int(frequency * (0.7 if in_peak else 1.0)))
+        current_time += interval
+    return departures
+
+@pytest.fixture(params=PEAK_VARIANTS, ids=("default-peaks", "other-peaks"))
+def peak_hours(request, monkeypatch):
+    monkeypatch.setattr(app, "PEAK_HOURS", request.param)
+    return request.param
+
+@pytest.mark.parametrize("snap_to_slots", (True, False))
+@pytest.mark.parametrize("start_time", START_TIMES)
+def test_iter_departures_matches_slot_scan(peak_hours, start_time, snap_to_slots):
+    routes = sample_routes()
+    start = parse_time(start_time, day_start=0)
+    departures = list(iter_departures(routes, start_time, snap_to_slots))
+
+    times = [t for t, _ in departures]
+    assert times == sorted(times)
+    for route in routes:
+        expected = reference_departures(route.frequency, start, snap_to_slots)
+        assert [t for t, r in departures if r is route] == expected
+
+@pytest.mark.parametrize("use_cache", (True, False))
+@pytest.mark.parametrize("start_time", START_TIMES)
+def test_generate_schedule_matches_slot_scan(peak_hours, start_time, use_cache):
+    routes = generate_schedule(sample_routes(), start_time, use_cache=use_cache)
+    start = parse_time(start_time, day_start=0)
+    for route in routes:
+        assert route.schedule == reference_departures(route.frequency, start, True)
+        assert route.last_assigned_time == (route.schedule[-1] if route.schedule else None)
+
+@pytest.mark.parametrize("snap_to_slots", (True, False))
+@pytest.mark.parametrize("start_time", START_TIMES)
+def test_vectorized_departures_matches_slot_scan(peak_hours, start_time, snap_to_slots):
+    np = pytest.importorskip("numpy")
+    routes = sample_routes()
+    start = parse_time(start_time, day_start=0)
+    route_index, departure_times = app.vectorized_departures(
+        [route.frequency for route in routes], start_time, snap_to_slots
+    )
+    for i, route in enumerate(routes):
+        expected = reference_departures(route.frequency, start, snap_to_slots)
+        assert departure_times[route_index == i].tolist() == expected
+    assert np.all(np.diff(route_index) >= 0)
+
+def test_vectorized_departures_without_routes():
+    pytest.importorskip("numpy")
+    route_index, departure_times = app.vectorized_departures([])
+    assert len(route_index) == len(departure_times) == 0
+    assert generate_schedule([], vectorized=True) == []
+
+def test_interval_index_overlaps():
+    index = IntervalIndex()
+    assert not index.overlaps(0, 100)
+    index.add(100, 140)
+    index.add(200, 230)
+
+    # Back-to-back trips share a boundary minute without overlapping
+    assert not index.overlaps(60, 100)
+    assert not index.overlaps(140, 200)
+    assert not index.overlaps(230, 260)
+
+    assert index.overlaps(100, 140)
+    assert index.overlaps(90, 101)
+    assert index.overlaps(139, 150)
+    assert index.overlaps(110, 120)
+    assert index.overlaps(50, 300)
+    assert index.overlaps(150, 210)
+
+    index.remove(100, 140)
+    assert len(index) == 1
+    assert not index.overlaps(100, 140)
+    assert index.overlaps(220, 240)
+
+def test_interval_index_matches_brute_force():
+    rng = random.Random(7)
+    index = IntervalIndex()
+    stored = []
+    for _ in range(2000):
+        start = rng.randrange(0, 600)
+        end = start + rng.randrange(1, 40)
+        expected = any(s < end and start < e for s, e in stored)
+        assert index.overlaps(start, end) == expected
+        if not expected:
+            index.add(start, end)
+            stored.append((start, end))
+        elif stored and rng.random() < 0.2:
+            s, e = stored.pop(rng.randrange(len(stored)))
+            index.remove(s, e)
+    assert index.starts == sorted(s for s, _ in stored)
+
+def depot_network(seed=0):
+    """Two-depot network solved per depot, as (routes, employees, result)"""
+    rng = random.Random(seed)
+    routes = [Route(f"R{i}", rng.randint(20, 80), 10, rng.randint(1, 10), f"D{i % 2}") for i in range(16)]
+    employees = app.staff_by_depot(routes)
+    result = app.solve_sharded(routes, employees, seed=seed, max_workers=1)
+    return routes, employees, result
+
+def rescheduled(seed=0):
+    """depot_network() repaired after a route, a retiming, a new route and sick calls"""
+    routes, employees, result = depot_network(seed)
+    before = {(r[0], r[1]): emp_id for emp_id, data in result[0].items() for r in data["routes"]}
+    sick = [emp.emp_id for emp in employees if emp.depot_id == "D0"][::3]
+    delta = {
+        "remove_routes": ["R1"],
+        "reprioritize": {"R2": 9 if routes[2].avg_priority < 5 else 1},
+        "add_routes": [Route("X", 40, 10, 8, "D0")],
+        "remove_employees": sick,
+    }
+    result = app.reschedule(routes, employees, result[0], delta)
+    return routes, employees, result, before, delta
+
+def test_reschedule_keeps_surviving_drivers():
+    routes, employees, result, before, delta = rescheduled()
+    sick = set(delta["remove_employees"])
+    kept = 0
+    for emp_id, data in result[0].items():
+        for route_id, start, _ in data["routes"]:
+            old_driver = before.get((route_id, start))
+            if old_driver is not None and old_driver not in sick:
+                assert old_driver == emp_id
+                kept += 1
+    assert kept
+    assert not sick & set(result[0])
+
+def test_reschedule_drops_removed_routes_and_stale_times():
+    routes, employees, result, before, delta = rescheduled()
+    timetables = {route.route_id: set(route.schedule) for route in routes}
+    assert "R1" not in timetables
+    assert "X" in timetables
+    for data in result[0].values():
+        for route_id, start, _ in data["routes"]:
+            assert start in timetables[route_id]
+    # Departures the retiming removed are gone rather than left with their driver
+    stale = {start for route_id, start in before if route_id == "R2"} - timetables["R2"]
+    assert stale
+    assert not any(r[0] == "R2" and r[1] in stale for data in result[0].values() for r in data["routes"])
+
+def test_reschedule_orphans_stay_in_shift_and_depot_without_conflicts():
+    routes, employees, result, _, _ = rescheduled()
+    depot_of = {route.route_id: route.depot_id for route in routes}
+    by_id = {emp.emp_id: emp for emp in employees}
+    for emp_id, data in result[0].items():
+        emp = by_id[emp_id]
+        trips = sorted(data["routes"], key=lambda r: r[1])
+        for (_, _, end), (_, next_start, _) in zip(trips, trips[1:]):
+            assert end <= next_start
+        for route_id, start, _ in trips:
+            assert depot_of[route_id] == emp.depot_id
+            assert ("morning" if app.is_morning(start) else "evening") == emp.shift
+
+@pytest.mark.parametrize("seed", (0, 1, 2))
+def test_reschedule_counts_match_schedule(seed):
+    routes, employees, result, _, _ = rescheduled(seed)
+    schedule, morning_assigned, morning_total, evening_assigned, evening_total = result
+    trips = [r for data in schedule.values() for r in data["routes"]]
+    departures = [t for route in routes for t in route.schedule]
+    assert morning_assigned == sum(1 for r in trips if app.is_morning(r[1]))
+    assert evening_assigned == len(trips) - morning_assigned
+    assert morning_total == sum(1 for t in departures if app.is_morning(t))
+    assert evening_total == len(departures) - morning_total
+    assert len(trips) == len(set((r[0], r[1]) for r in trips))
+
+def schedule_cost(employees, schedule, repeat_penalty=20.0):
+    """The objective improve_schedule minimises, recomputed from a schedule"""
+    total = 0
+    for emp in employees:
+        trips = schedule[emp.emp_id]["routes"]
+        route_ids = [r[0] for r in trips]
+        total += sum(end - start for _, start, end in trips) ** 2 / 100
+        total += repeat_penalty * (len(route_ids) - len(set(route_ids)))
+    return total
+
+def improved(seed, repaired):
+    if repaired:
+        routes, employees, result, _, _ = rescheduled(seed)
+    else:
+        routes, employees, result = depot_network(seed)
+    covered_before = {(r[0], r[1]) for data in result[0].values() for r in data["routes"]}
+    cost_before = schedule_cost(employees, result[0])
+    stats = app.SchedulerStats()
+    result = app.improve_schedule(routes, employees, result, time_budget=0.05, seed=seed, stats=stats)
+    return routes, employees, result, covered_before, cost_before, stats
+
+@pytest.mark.parametrize("repaired", (False, True), ids=("solved", "rescheduled"))
+@pytest.mark.parametrize("seed", (0, 1))
+def test_improve_schedule_never_drops_coverage(seed, repaired):
+    routes, employees, result, covered_before, _, stats = improved(seed, repaired)
+    schedule = result[0]
+
+    trips = [r for data in schedule.values() for r in data["routes"]]
+    assert covered_before <= {(r[0], r[1]) for r in trips}
+    assert len(trips) == len(covered_before) + stats.improvement["covered"]
+    assert len(trips) == result[1] + result[3]
+    assert stats.improvement["cost_after"] == pytest.approx(schedule_cost(employees, schedule))
+
+    depot_of = {route.route_id: route.depot_id for route in routes}
+    for emp in employees:
+        emp_trips = schedule[emp.emp_id]["routes"]
+        for (_, _, end), (_, next_start, _) in zip(emp_trips, emp_trips[1:]):
+            assert end <= next_start
+        for route_id, start, _ in emp_trips:
+            assert depot_of[route_id] == emp.depot_id
+            assert ("morning" if app.is_morning(start) else "evening") == emp.shift
+
+def test_improve_schedule_never_raises_cost():
+    # Seed 3 is fully covered, so only the search itself can change the cost
+    # (covering a trip the greedy left open adds its minutes, as it should)
+    routes, employees, result, _, cost_before, stats = improved(3, repaired=False)
+    assert stats.improvement["covered"] == 0
+    assert stats.improvement["moves"] + stats.improvement["swaps"] > 0
+    assert stats.improvement["cost_after"] <= stats.improvement["cost_before"]
+    assert stats.improvement["cost_before"] == pytest.approx(cost_before)
+    assert schedule_cost(employees, result[0]) <= cost_before
+
+def horizon_network():
+    routes = [Route(f"R{i}", 30 + 5 * i, 10, 1 + i % 10) for i in range(6)]
+    return routes, app.horizon_crew(routes)
+
+def test_iter_horizon_respects_weekly_cap_and_rest():
+    routes, employees = horizon_network()
+    cap = 900
+    days = itertools.repeat(routes, app.DAYS_PER_WEEK + 3)
+    week_minutes = {}
+    last_end = {}
+    for day, result, _ in app.iter_horizon(days, employees, seed=0, max_weekly_minutes=cap):
+        if day % app.DAYS_PER_WEEK == 0:
+            week_minutes = {}
+        for emp_id, data in result[0].items():
+            trips = data["routes"]
+            if not trips:
+                last_end.pop(emp_id, None)
+                continue
+            # The previous day's last trip is MINUTES_PER_DAY earlier on today's clock
+            if emp_id in last_end:
+                assert trips[0][1] >= last_end[emp_id] + app.MIN_REST_MINUTES - app.MINUTES_PER_DAY
+            last_end[emp_id] = trips[-1][2]
+            week_minutes[emp_id] = week_minutes.get(emp_id, 0) + sum(end - start for _, start, end in trips)
+            assert week_minutes[emp_id] <= cap
+    assert day == app.DAYS_PER_WEEK + 2
+
+def assert_carry_over_cleared(employees):
+    for emp in employees:
+        assert emp.rest_until is None
+        assert emp.work_limit is None
+        assert emp.week_work_time == 0
+
+def test_iter_horizon_clears_carry_over_when_exhausted():
+    routes, employees = horizon_network()
+    assert len(list(app.iter_horizon(itertools.repeat(routes, 3), employees, seed=0, max_weekly_minutes=900))) == 3
+    assert_carry_over_cleared(employees)
+
+def test_iter_horizon_clears_carry_over_when_closed():
+    routes, employees = horizon_network()
+    horizon = app.iter_horizon(itertools.repeat(routes, 5), employees, seed=0, max_weekly_minutes=900)
+    next(horizon)
+    next(horizon)
+    assert any(emp.week_work_time for emp in employees)
+    assert any(emp.work_limit is not None for emp in employees)
+    horizon.close()
+    assert_carry_over_cleared(employees)
+
+def test_export_binary_round_trip():
+    routes, employees, result = depot_network()
+    employees[0].name = "Zoë Łukasiewicz"
+    buffer = io.BytesIO()
+    app.export_binary(buffer, routes, employees, result[0])
+    buffer.seek(0)
+    read_employees, route_ids, records = app.read_binary(buffer)
+
+    assert read_employees == [(emp.emp_id, emp.name, emp.shift) for emp in employees]
+    assert route_ids == [route.route_id for route in routes]
+    assert records == [
+        (emp.emp_id, route_id, start, end)
+        for emp in employees
+        for route_id, start, end in result[0][emp.emp_id]["routes"]
+    ]
+
+def test_export_schedule_writes_readable_binary(tmp_path):
+    routes, employees, result = depot_network()
+    path = tmp_path / "schedule.bin"
+    app.export_schedule(str(path), routes, employees, result)
+    with open(path, "rb") as f:
+        _, _, records = app.read_binary(f)
+    assert len(records) == result[1] + result[3]
+
+def test_read_binary_rejects_other_files():
+    with pytest.raises(ValueError):
+        app.read_binary(io.BytesIO(b"XXXX" + bytes(app._BINARY_HEADER.size - 4)))